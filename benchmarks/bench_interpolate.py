@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Benchmark interpolate() and reused Interpolator plans
+
+Sweeps input size, data type, index density, and thread count, reporting
+the throughput of each case in output points per second and, for runs
+with more than one thread, the parallel scaling efficiency relative to
+the single-thread run of the same case.
+
+Results can be saved as a baseline and later runs compared against it;
+any case whose throughput drops more than the tolerance below the
+baseline is reported as a regression and the script exits with status 1.
+
+With --contention, the wall time of a kernel is also measured while a
+busy Python thread runs; as the kernels release the GIL, it should not
+grow beyond the share of CPU the other thread takes. The script exits
+with status 1 if it does.
+
+Example:
+  python benchmarks/bench_interpolate.py --save baseline.json
+  python benchmarks/bench_interpolate.py --compare baseline.json
+  python benchmarks/bench_interpolate.py --contention --sizes medium --dtypes float32
+
+"""
+import argparse
+import os
+import sys
+import threading
+import timeit
+
+import numpy as np
+
+from idlpy.interpolate import BACKEND, Interpolator, interpolate
+
+from common import report, addBaselineArguments, checkBaseline
+
+SIZES = {                                                                               # Number of input points along each axis
+  'small'  : {1 : 10000,    2 : 100, 3 : 24},
+  'medium' : {1 : 1000000,  2 : 1000, 3 : 100},
+  'large'  : {1 : 10000000, 2 : 3000, 3 : 200},
+}
+DTYPES    = ('uint8', 'int16', 'float32', 'float64')
+DENSITIES = (0.5, 2.0)                                                                  # Output points per input point along each axis
+WIDTH     = 45                                                                          # Width of case names in output
+
+def threadCounts():
+  """Thread counts to benchmark; powers of two up to the number of CPUs"""
+
+  ncpu   = os.cpu_count() or 1
+  counts = [1]
+  while counts[-1] * 2 <= ncpu:
+    counts.append( counts[-1] * 2 )
+  if counts[-1] != ncpu:
+    counts.append( ncpu )
+  return counts
+
+def makeCase( ndim, size, dtype, density ):
+  """
+  Generate data and interpolation indices for a case
+
+  Arguments:
+    ndim (int) : Number of dimensions
+    size (str) : Key into SIZES
+    dtype (str) : Data type
+    density (float) : Output points per input point along each axis
+
+  Returns:
+    tuple : Data array and list of index arrays
+
+  """
+
+  n    = SIZES[size][ndim]
+  rng  = np.random.default_rng( 0 )
+  data = (rng.random( (n,) * ndim ) * 100).astype( dtype )
+  ids  = [np.linspace( 0, n-1, int(n * density), dtype = np.float64 ) for i in range( ndim )]
+  return data, ids
+
+def timeCall( func, repeat ):
+  """Best time, in seconds, of repeat calls to func"""
+
+  return min( timeit.repeat( func, number = 1, repeat = repeat ) )
+
+def run( sizes, dtypes, densities, threads, repeat ):
+  """
+  Run the benchmark sweep
+
+  Arguments:
+    sizes (list) : Keys into SIZES
+    dtypes (list) : Data types
+    densities (list) : Index densities
+    threads (list) : Thread counts; should include 1 for scaling efficiency
+    repeat (int) : Number of timed calls per case; best is kept
+
+  Returns:
+    dict : Results keyed by case name; each has points, seconds,
+      throughput (points per second), and efficiency
+
+  """
+
+  results = {}
+  for size in sizes:
+    for ndim in (1, 2, 3):
+      for dtype in dtypes:
+        for density in densities:
+          data, ids = makeCase( ndim, size, dtype, density )
+          npts      = int( np.prod( [i.size for i in ids] ) )
+          plan      = Interpolator( data.shape, *ids, double = data.dtype != np.float32 )  # Plan reused across calls, as for many fields
+          calls     = {
+            'interpolate'  : lambda n: interpolate( data, *ids, num_threads = n ),
+            'Interpolator' : lambda n: plan( data, num_threads = n ),
+          }
+          for name, call in calls.items():
+            single = None
+            for n in threads:
+              key  = '{}/{}d/{}/{}/x{}/t{}'.format( name, ndim, size, dtype, density, n )
+              secs = timeCall( lambda: call( n ), repeat )
+              if n == 1:
+                single = secs
+              results[key] = {
+                'points'     : npts,
+                'seconds'    : secs,
+                'throughput' : npts / secs,
+                'efficiency' : single / secs / n if single else None,
+              }
+              report( key, summary( results[key] ), WIDTH )
+  return results
+
+def summary( res ):
+  """Text of the result line of a case"""
+
+  eff = '' if res['efficiency'] is None else '{:6.1%}'.format( res['efficiency'] )
+  return '{:12.4g} pts/s {:>7s}'.format( res['throughput'], eff )
+
+def contention( size, dtype, repeat, tolerance ):
+  """
+  Check that a kernel does not slow down while a Python thread is busy
+
+  A 3D interpolate() call is run on one thread alone, then while another
+  thread spins in Python. If the kernel holds or keeps taking the GIL, it waits
+  on the other thread and its wall time grows well beyond the time the
+  thread takes from it; with one CPU that is half, else none.
+
+  Arguments:
+    size (str) : Key into SIZES
+    dtype (str) : Data type
+    repeat (int) : Number of timed calls; best is kept
+    tolerance (float) : Allowed fractional growth of wall time beyond
+      the share of CPU taken by the busy thread
+
+  Returns:
+    bool : True if the check passed
+
+  """
+
+  data, ids = makeCase( 3, size, dtype, DENSITIES[-1] )
+  call      = lambda: interpolate( data, *ids, num_threads = 1 )
+  alone     = timeCall( call, repeat )
+
+  stop = threading.Event()
+  def spin():
+    n = 0
+    while not stop.is_set():
+      n += 1
+  thread = threading.Thread( target = spin, daemon = True )
+  thread.start()
+  try:
+    busy = timeCall( call, repeat )
+  finally:
+    stop.set()
+    thread.join()
+
+  limit = (1 + tolerance) * max( 1.0, 2.0 / (os.cpu_count() or 1) )                      # With one CPU the thread takes half of it
+  ratio = busy / alone
+  print( 'Contention interpolate/3d/{}/{}: alone {:.4g} s, with busy thread {:.4g} s, ratio {:.2f} (limit {:.2f})'.format(
+          size, dtype, alone, busy, ratio, limit ) )
+  return ratio <= limit
+
+def main( argv = None ):
+  parser = argparse.ArgumentParser( description = 'Benchmark idlpy interpolation' )
+  parser.add_argument( '--sizes',     nargs = '+', default = ['small', 'medium'], choices = list( SIZES ) )
+  parser.add_argument( '--dtypes',    nargs = '+', default = list( DTYPES ) )
+  parser.add_argument( '--densities', nargs = '+', type = float, default = list( DENSITIES ) )
+  parser.add_argument( '--threads',   nargs = '+', type = int, default = threadCounts() )
+  parser.add_argument( '--repeat',    type = int, default = 5, help = 'Timed calls per case; best is kept' )
+  addBaselineArguments( parser )
+  parser.add_argument( '--contention', action = 'store_true', help = 'Also check kernel wall time with a busy Python thread' )
+  args = parser.parse_args( argv )
+
+  print( 'Backend: {}, CPUs: {}'.format( BACKEND, os.cpu_count() ) )
+  results = run( args.sizes, args.dtypes, args.densities, args.threads, args.repeat )
+
+  if checkBaseline( args, results, {'backend' : BACKEND}, match = ('backend',), width = WIDTH ):
+    return 1
+  if args.contention:
+    if not contention( args.sizes[-1], args.dtypes[-1], args.repeat, args.tolerance ):
+      print( 'REGRESSION kernel wall time grows with a busy Python thread' )
+      return 1
+  return 0
+
+if __name__ == "__main__":
+  sys.exit( main() )
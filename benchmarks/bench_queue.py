@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark the IDL job queue, using a stand-in for IDL
+
+Runs batches of short jobs through IDLAsyncQueue with benchmarks/fake_idl.py
+in place of IDL, so the overhead of spawning processes, reading their
+output, and scheduling jobs can be measured without an IDL licence. For
+each mode and concurrency level the throughput in jobs per second, the
+dispatch latency (time from a job finishing to the next job starting in
+the freed slot), the overhead of each job (wall time less the time it
+sleeps), and the peak number of threads and open file descriptors of
+this process are reported.
+
+Results can be saved as a baseline and later runs compared against it;
+any case whose throughput drops more than the tolerance below the
+baseline is reported as a regression and the script exits with status 1.
+
+Example:
+  python benchmarks/bench_queue.py --save baseline.json
+  python benchmarks/bench_queue.py --compare baseline.json
+
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from idlpy import idlSpawn
+from idlpy.idlSpawn import IDLJob, IDLAsyncQueue
+
+from common import report, addBaselineArguments, checkBaseline
+
+WIDTH    = 20                                                                           # Width of case names in output
+FAKE_IDL = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'fake_idl.py' )
+MODES    = {                                                                            # Keywords for IDLAsyncQueue
+  'spawn'    : {},
+  'sessions' : {'sessions' : True},
+  'batch'    : {'batch' : 'auto', 'batchTime' : 0.5},
+}
+
+class Sampler( threading.Thread ):
+  """Record the peak number of threads and open file descriptors"""
+
+  def __init__(self, interval = 0.005):
+    threading.Thread.__init__( self, daemon = True )
+    self.interval = interval
+    self.threads  = 0
+    self.fds      = 0
+    self._halt    = threading.Event()
+
+  def run(self):
+    while not self._halt.is_set():
+      self.threads = max( self.threads, threading.active_count() - 1 )             # Not counting this thread
+      self.fds     = max( self.fds, openFDs() )
+      self._halt.wait( self.interval )
+
+  def stop(self):
+    self._halt.set()
+    self.join()
+
+def openFDs():
+  """Number of open file descriptors of this process; 0 if unknown"""
+
+  try:
+    return len( os.listdir( '/proc/self/fd' ) )
+  except OSError:
+    return 0
+
+def dispatchLatency( jobs, concurrency ):
+  """
+  Time from a job ending to the start of the job that took its slot
+
+  Jobs of a batch after the first run in the slot of the batch, so with
+  batching this is the time between jobs of a batch.
+
+  Arguments:
+    jobs (list) : Finished IDLJobs
+    concurrency (int) : Number of slots
+
+  Returns:
+    list : Latency, in seconds, of each job started after a job ended
+
+  """
+
+  starts = sorted( job.startTime for job in jobs )[concurrency:]                   # Jobs that waited for a slot
+  ends   = sorted( job.endTime for job in jobs )
+  return [start - end for start, end in zip( starts, ends )]                       # The i-th waiting job takes the slot of the i-th job to end
+
+def percentiles( vals ):
+  """p50, p90, p99, and max of vals; None if empty"""
+
+  if len(vals) == 0:
+    return None
+  return dict( zip( ('p50', 'p90', 'p99', 'max'), np.percentile( vals, [50, 90, 99, 100] ).tolist() ) )
+
+def runCase( mode, concurrency, njobs, sleep ):
+  """
+  Run one case
+
+  Arguments:
+    mode (str) : Key into MODES
+    concurrency (int) : Queue concurrency
+    njobs (int) : Number of jobs to run
+    sleep (float) : Seconds each job sleeps
+
+  Returns:
+    dict : Result of the case
+
+  """
+
+  queue = IDLAsyncQueue( concurrency, **MODES[mode] )
+  jobs  = [IDLJob( 'WAIT, {}'.format( sleep ) ) for i in range( njobs )]
+  for job in jobs:
+    queue.submitJob( job )
+
+  sampler = Sampler()
+  sampler.start()
+  t0             = time.time()
+  nsuccess, ntot = queue.startJobs()
+  secs           = time.time() - t0
+  sampler.stop()
+  queue.close()
+
+  return {
+    'jobs'       : ntot,
+    'failed'     : ntot - nsuccess,
+    'seconds'    : secs,
+    'throughput' : ntot / secs,
+    'latency'    : percentiles( dispatchLatency( jobs, concurrency ) ),
+    'overhead'   : percentiles( [job.endTime - job.startTime - sleep for job in jobs] ),
+    'threads'    : sampler.threads,
+    'fds'        : sampler.fds,
+  }
+
+def summary( res ):
+  """Text of the result line of a case"""
+
+  lat = res['latency']['p50'] * 1000 if res['latency'] else float('nan')
+  return '{:9.1f} jobs/s  latency p50 {:7.2f} ms  overhead p50 {:7.2f} ms  threads {:3d}  fds {:4d}  failed {}'.format(
+          res['throughput'], lat, res['overhead']['p50'] * 1000, res['threads'], res['fds'], res['failed'] )
+
+def run( modes, concurrencies, njobs, sleep ):
+  """
+  Run the benchmark sweep
+
+  Arguments:
+    modes (list) : Keys into MODES
+    concurrencies (list) : Queue concurrency levels
+    njobs (int) : Number of jobs per case
+    sleep (float) : Seconds each job sleeps
+
+  Returns:
+    dict : Results keyed by case name
+
+  """
+
+  results = {}
+  for mode in modes:
+    for concurrency in concurrencies:
+      key          = '{}/c{}'.format( mode, concurrency )
+      results[key] = runCase( mode, concurrency, njobs, sleep )
+      report( key, summary( results[key] ), WIDTH )
+  return results
+
+def main( argv = None ):
+  parser = argparse.ArgumentParser( description = 'Benchmark the idlpy job queue with a stand-in for IDL' )
+  parser.add_argument( '--modes',       nargs = '+', default = list( MODES ), choices = list( MODES ) )
+  parser.add_argument( '--concurrency', nargs = '+', type = int, default = [1, 2, 4, 8, 16] )
+  parser.add_argument( '--jobs',        type = int, default = 200, help = 'Jobs per case' )
+  parser.add_argument( '--sleep',       type = float, default = 0.0, help = 'Seconds each job sleeps' )
+  parser.add_argument( '--lines',       type = int, default = 10, help = 'Lines of output per job' )
+  parser.add_argument( '--startup',     type = float, default = 0.0, help = 'Seconds the stand-in takes to start' )
+  parser.add_argument( '--fail',        type = float, default = 0.0, help = 'Fraction of jobs that fail' )
+  parser.add_argument( '--idl',         default = FAKE_IDL, help = 'IDL executable to run' )
+  addBaselineArguments( parser )
+  args = parser.parse_args( argv )
+
+  logging.getLogger( 'idlpy' ).setLevel( logging.CRITICAL )                         # Do not time logging of job output
+  idlSpawn.IDL_EXE = args.idl
+  os.environ.update( {
+    'FAKEIDL_STARTUP' : str( args.startup ),
+    'FAKEIDL_LINES'   : str( args.lines ),
+    'FAKEIDL_FAIL'    : str( args.fail ),
+  } )
+
+  print( 'IDL: {}, jobs: {}, sleep: {} s, CPUs: {}'.format( args.idl, args.jobs, args.sleep, os.cpu_count() ) )
+  results = run( args.modes, args.concurrency, args.jobs, args.sleep )
+
+  if checkBaseline( args, results, {'args' : vars( args )}, width = WIDTH ):
+    return 1
+  return 0
+
+if __name__ == "__main__":
+  sys.exit( main() )
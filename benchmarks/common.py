@@ -0,0 +1,83 @@
+"""
+Helpers shared by the benchmark scripts
+
+Each script runs a sweep of cases, giving a dict of results keyed by case
+name with a throughput for each case. The helpers here print results,
+add the options to save and compare against a baseline, and do the
+comparison, reporting any case whose throughput drops more than the
+tolerance below the baseline as a regression.
+
+"""
+import json
+
+def report( key, text, width = 45 ):
+  """Print one result line; the case name, then text"""
+
+  print( '{:{}s} {}'.format( key, width, text ), flush = True )
+
+def addBaselineArguments( parser ):
+  """Add the --save, --compare, and --tolerance options to an ArgumentParser"""
+
+  parser.add_argument( '--save',      help = 'Write results to this JSON file as a baseline' )
+  parser.add_argument( '--compare',   help = 'Compare results against this baseline JSON file' )
+  parser.add_argument( '--tolerance', type = float, default = 0.2, help = 'Allowed fractional drop in throughput' )
+
+def compare( results, baseline, tolerance, width = 45 ):
+  """
+  Compare results against a baseline
+
+  Arguments:
+    results (dict) : Results of a sweep; each has a throughput
+    baseline (dict) : Results of a previous sweep
+    tolerance (float) : Allowed fractional drop in throughput
+
+  Keyword arguments:
+    width (int) : Width of case names in the output
+
+  Returns:
+    list : Keys of cases that regressed
+
+  """
+
+  regressed = []
+  for key, res in results.items():
+    if key not in baseline:
+      continue
+    ratio = res['throughput'] / baseline[key]['throughput']
+    if ratio < 1 - tolerance:
+      regressed.append( key )
+      print( 'REGRESSION {:{}s} {:6.1%} of baseline'.format( key, width, ratio ) )
+  return regressed
+
+def checkBaseline( args, results, info, match = (), width = 45 ):
+  """
+  Save results and compare them against a baseline, as set by the options
+  added by addBaselineArguments()
+
+  Arguments:
+    args (argparse.Namespace) : Parsed options
+    results (dict) : Results of a sweep
+    info (dict) : Saved with the results; e.g., settings of the run
+
+  Keyword arguments:
+    match (tuple) : Keys of info that must be the same in the baseline
+      for the results to be compared
+    width (int) : Width of case names in the output
+
+  Returns:
+    bool : True if the results regressed, or cannot be compared
+
+  """
+
+  if args.save:
+    with open( args.save, 'w' ) as fid:
+      json.dump( dict( info, results = results ), fid, indent = 2 )
+  if not args.compare:
+    return False
+  with open( args.compare ) as fid:
+    baseline = json.load( fid )
+  for key in match:
+    if baseline.get( key ) != info[key]:
+      print( 'Baseline was run with {} {}, this run with {}'.format( key, baseline.get( key ), info[key] ) )
+      return True
+  return len( compare( results, baseline['results'], args.tolerance, width ) ) > 0
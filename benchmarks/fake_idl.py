@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the IDL executable, for testing and benchmarking IDLJobs
+without an IDL installation or licence
+
+Run as 'fake_idl.py -e COMMAND' it runs the command and exits, like
+'idl -e'; run with no arguments it runs commands read from stdin, one
+per line, like an IDLSession. Statements of a command are separated by
+' & ', as built by IDLJob, and the following are understood:
+
+  WAIT, seconds          : Sleep
+  PRINT, 'text'          : Print text to stdout
+  MESSAGE, 'text'        : Print '% $MAIN$: text' to stderr, so the
+                           finished message of an IDLJob is emitted
+  EXIT                   : Exit
+  FAIL                   : Fail; the rest of the command is skipped
+
+Other statements are ignored. Behaviour can be tuned with environment
+variables, which IDLJobs pass on to the process:
+
+  FAKEIDL_STARTUP : Seconds to sleep at startup, to model IDL start up
+  FAKEIDL_SLEEP   : Seconds to sleep for each job
+  FAKEIDL_LINES   : Lines of output to print for each job
+  FAKEIDL_FAIL    : Fraction of jobs that fail at random
+
+A job is a command with a MESSAGE statement, as IDLJobs end with one;
+the lines an IDLSession sends between jobs are not affected.
+
+Example:
+  IDLPY_IDL=benchmarks/fake_idl.py python -c "from idlpy import IDLJob; print(IDLJob('WAIT, 1').start())"
+
+"""
+import os
+import random
+import re
+import sys
+import time
+
+STARTUP = float( os.environ.get( 'FAKEIDL_STARTUP', 0 ) )
+SLEEP   = float( os.environ.get( 'FAKEIDL_SLEEP',   0 ) )
+LINES   = int(   os.environ.get( 'FAKEIDL_LINES',   0 ) )
+FAIL    = float( os.environ.get( 'FAKEIDL_FAIL',    0 ) )
+
+def fail( statement ):
+  """Print an IDL style error message to stderr"""
+
+  print( '% Attempt to call undefined procedure: {}.'.format( statement ), file = sys.stderr, flush = True )
+
+def run( cmd ):
+  """
+  Run one command
+
+  Arguments:
+    cmd (str) : Statements separated by ' & '
+
+  Returns:
+    bool : False if the command failed
+
+  """
+
+  if 'MESSAGE' in cmd.upper():                                                           # If command is a job
+    if SLEEP > 0:
+      time.sleep( SLEEP )
+    for i in range( LINES ):
+      print( 'fake_idl output line {}'.format( i ) )
+    sys.stdout.flush()
+    if FAIL > 0 and random.random() < FAIL:
+      fail( 'FAKEIDL_FAIL' )
+      return False
+
+  for statement in cmd.split( ' & ' ):
+    statement = statement.strip()
+    name      = statement.split( ',' )[0].strip().upper()
+    text      = ''.join( re.findall( r"'([^']*)'", statement ) )
+    if name == 'EXIT':
+      sys.exit( 0 )
+    elif name == 'FAIL':
+      fail( 'FAIL' )
+      return False
+    elif name == 'WAIT':
+      time.sleep( float( statement.split( ',' )[1] ) )
+    elif name == 'PRINT':
+      print( text, flush = True )
+    elif name == 'MESSAGE':
+      print( '% $MAIN$: ' + text, file = sys.stderr, flush = True )
+  return True
+
+def main( argv ):
+  if STARTUP > 0:
+    time.sleep( STARTUP )
+  if '-e' in argv:
+    return 0 if run( argv[argv.index( '-e' ) + 1] ) else 1
+  for line in sys.stdin:
+    if line.strip() != '':
+      run( line.rstrip( '\n' ) )
+  return 0
+
+if __name__ == "__main__":
+  sys.exit( main( sys.argv ) )
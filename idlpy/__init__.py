@@ -1,8 +1,8 @@
 from .structure import Structure
-from .interpolate import interpolate
+from .interpolate import interpolate, interpol, Interpolator, BACKEND as INTERPOLATE_BACKEND
 from .randomu import randomu
 from .file_search import file_search
-from .idlSpawn import IDLJob, IDLAsyncQueue
+from .idlSpawn import IDLJob, IDLSession, IDLSessionPool, IDLCache, IDLAsyncQueue, IDLExecutor, IDLAsyncioQueue
 from .time.make_time import make_time
 from .time.julday import julday, julday_no_leap
 from .time.jtime import JTime
@@ -0,0 +1,699 @@
+from cython.parallel import prange, threadid
+import numpy as np
+
+from libc.math cimport floor
+from libc.stdio cimport printf
+cimport numpy as np
+cimport cython
+
+cdef extern from *:                                                                      # OpenMP default threads; 1 if built without OpenMP
+  """
+  #ifdef _OPENMP
+  #include <omp.h>
+  static int ompMaxThreads( void ) { return omp_get_max_threads(); }
+  #else
+  static int ompMaxThreads( void ) { return 1; }
+  #endif
+  """
+  int ompMaxThreads() noexcept nogil
+
+ctypedef fused data_t:                                                                   # Must match NATIVE_TYPES in interpolate.py
+  unsigned char
+  short
+  unsigned short
+  int
+  long long
+  float
+  double
+
+ctypedef fused real_t:
+  float
+  double
+
+cdef inline long checkBound( long id, long n ) noexcept nogil:
+  """
+  Checks that given index is within bounds of axis of length n
+
+  Arguments:
+    id (long) : Index into array dimension
+    n (long) : Length of array dimensions
+
+  Keyword arguments:
+    None.
+
+  Returns:
+    long : Index adjusted to be within bounds
+
+  """
+
+  if id < 0:                                                                            # If index less than zero
+    return 0                                                                            # Return zero
+  elif id >= n:                                                                         # Else if greater or equal length of dimension
+    return n-1                                                                          # Return n-1; maximum index for given dimension
+  return id                                                                             # Just return index
+
+cdef inline real_t checkIndex( real_t id, long n0, long n1 ) noexcept nogil:
+  if id >= n1 or id < n0:
+    return 0.0
+  return id-n0
+
+cdef int numThreads( int n ) noexcept nogil:
+  """
+  Number of threads to use for a parallel loop
+
+  Arguments:
+    n (int) : Requested number of threads
+
+  Returns:
+    int : n if positive, else the OpenMP default number of threads; 1
+      if built without OpenMP
+
+  """
+
+  if n > 0:
+    return n
+  return ompMaxThreads()
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void linearTaps( const real_t [:] id, long n, Py_ssize_t [:,::1] idx, real_t [:,::1] w ) noexcept nogil:
+  """
+  Compute the two neighbour indices and linear weights for each
+  interpolation index along an axis of length n
+
+  Indices outside of the axis are clamped to the nearest edge, exactly as
+  done by checkBound and checkIndex. A neighbour with zero weight has the
+  index of the other neighbour, so it is not read from elsewhere in
+  memory; the kernels still skip it, see blend2.
+
+  """
+
+  cdef:
+    Py_ssize_t i
+    real_t d
+
+  for i in range( id.shape[0] ):
+    idx[i,0] = checkBound( <long> id[i], n )
+    idx[i,1] = checkBound( idx[i,0] + 1, n )
+    d        = checkIndex( id[i], idx[i,0], idx[i,1] )
+    w[i,0]   = 1 - d
+    w[i,1]   = d
+    if d == 0:                                                                          # Unused neighbour; point at used one so a NaN there is not blended
+      idx[i,1] = idx[i,0]
+
+cdef inline real_t blend2( real_t v0, real_t w0, real_t v1, real_t w1 ) noexcept nogil:
+  """
+  Blend two neighbours, skipping one with zero weight so that an inf or
+  NaN there does not turn the result into NaN
+
+  """
+
+  if w1 == 0:
+    return v0 * w0
+  if w0 == 0:
+    return v1 * w1
+  return v0 * w0 + v1 * w1
+
+cdef inline real_t cubicWeight( real_t s, real_t a ) noexcept nogil:
+  """
+  Cubic convolution kernel of Park and Schowengerdt (1983)
+
+  Arguments:
+    s (real_t) : Distance from the interpolation point
+    a (real_t) : Interpolation parameter; IDL CUBIC keyword value
+
+  Returns:
+    real_t : Weight for sample at distance s
+
+  """
+
+  if s < 0:
+    s = -s
+  if s <= 1:
+    return ((a + 2) * s - (a + 3)) * s * s + 1
+  elif s < 2:
+    return ((a * s - 5 * a) * s + 8 * a) * s - 4 * a
+  return 0
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void cubicTaps( const real_t [:] id, long n, real_t a, Py_ssize_t [:,::1] idx, real_t [:,::1] w ) noexcept nogil:
+  """
+  Compute the four neighbour indices and cubic convolution weights for
+  each interpolation index along an axis of length n
+
+  Indices outside of the axis are clamped to the nearest edge, matching
+  the behaviour of the linear kernels. Neighbours with zero weight have
+  the index of i0.
+
+  """
+
+  cdef:
+    Py_ssize_t i, k
+    long i0
+    real_t t
+
+  for i in range( id.shape[0] ):
+    if id[i] < 0:                                                                       # If before first element
+      i0 = 0
+      t  = 0
+    elif id[i] >= n-1:                                                                  # If at or past last element
+      i0 = n-1
+      t  = 0
+    else:
+      i0 = <long> floor( id[i] )
+      t  = id[i] - i0
+    for k in range( 4 ):                                                                # Taps at i0-1, i0, i0+1, i0+2
+      idx[i,k] = checkBound( i0 - 1 + k, n )
+      w[i,k]   = cubicWeight( t - (k - 1), a )
+    for k in range( 4 ):                                                                # Unused neighbours point at i0, which always has weight
+      if w[i,k] == 0:
+        idx[i,k] = idx[i,1]
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef real_t blendCorners( const data_t [:,::1] data, Py_ssize_t b, Py_ssize_t *rows, int ndim,
+                          Py_ssize_t [:,::1] idx, real_t [:,::1] w, Py_ssize_t [:] strides,
+                          bint skipnan ) noexcept nogil:
+  """
+  Blend all neighbours of one output element of N-dimensional data
+
+  Arguments:
+    data (data_t) : Data, with batch dimension, flattened to 2D
+    b (Py_ssize_t) : Index into batch dimension
+    rows (Py_ssize_t *) : Row of idx and w to use for each dimension
+    ndim (int) : Number of dimensions
+    idx (Py_ssize_t) : Neighbour indices for all dimensions, stacked
+    w (real_t) : Neighbour weights for all dimensions, stacked
+    strides (Py_ssize_t) : Element stride of each dimension of data
+    skipnan (bint) : Skip NaN neighbours and renormalize weights
+
+  Returns:
+    real_t : Interpolated value
+
+  """
+
+  cdef:
+    int a
+    Py_ssize_t c, t, rem, off
+    Py_ssize_t nt = w.shape[1]
+    Py_ssize_t ncorner = 1
+    real_t acc = 0
+    real_t accW = 0
+    real_t wt, v
+
+  for a in range( ndim ):
+    ncorner *= nt
+  for c in range( ncorner ):                                                            # Iterate over all neighbours
+    rem = c
+    off = 0
+    wt  = 1
+    for a in range( ndim-1, -1, -1 ):                                                   # Neighbour index along each dimension from digits of c
+      t    = rem % nt
+      rem  = rem // nt
+      wt  *= w[rows[a], t]
+      if wt == 0:                                                                       # Neighbour does not contribute
+        break
+      off += idx[rows[a], t] * strides[a]
+    if wt != 0:
+      v = data[b, off]
+      if not (skipnan and v != v):
+        acc  += v * wt
+        accW += wt
+  if skipnan:
+    return acc / accW
+  return acc
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _locate( const real_t [:] x, const real_t [:] xout, int num_threads = 0, double eps = 2.220446049250313e-16 ):
+  """
+  Convert coordinates to fractional indices along a monotonic axis
+
+  Arguments:
+    x (real_t)    : Coordinates of the axis; strictly increasing or
+      strictly decreasing
+    xout (real_t) : Coordinates to locate
+
+  Keyword arguments:
+    num_threads (int) : Number of threads to use; if not positive
+      (default), the OpenMP default is used
+    eps (float) : Relative precision the coordinates were given in; x is
+      taken as uniform if it differs from uniform spacing by no more than
+      the rounding error of its largest value
+
+  Returns:
+    Fractional indices of xout along x, type of x. Coordinates outside of
+    x give indices outside of the axis, found by linear extrapolation
+    from the first or last interval
+
+  """
+
+  cdef:
+    Py_ssize_t i, lo, hi, mid
+    Py_ssize_t n = x.shape[0]
+    Py_ssize_t nout = xout.shape[0]
+    real_t sign, dx, v
+    double tol
+    bint uniform = True
+
+  if n < 2:
+    raise Exception( 'Coordinate array must have at least two elements' )
+  out  = np.empty( (nout,), dtype=np.asarray(x).dtype )
+  sign = 1 if x[n-1] > x[0] else -1                                                    # Direction of axis
+  dx   = (x[n-1] - x[0]) / (n - 1)                                                      # Spacing if uniform
+  tol  = max( 1e-6 * sign * dx, 4 * eps * max( abs( x[0] ), abs( x[n-1] ) ) )         # Spacing tolerance; rounding error of coordinates
+  for i in range( 1, n ):
+    if sign * (x[i] - x[i-1]) <= 0:
+      raise Exception( 'Coordinates must be strictly monotonic' )
+    if uniform and abs( x[i] - (x[0] + i * dx) ) > tol:                                 # If not within tolerance of uniform spacing
+      uniform = False
+
+  cdef real_t [:] outView = out
+  num_threads = numThreads( num_threads )
+  if uniform:                                                                           # Index follows directly from spacing
+    for i in prange( nout, nogil=True, num_threads=num_threads ):
+      outView[i] = (xout[i] - x[0]) / dx
+    return out
+
+  for i in prange( nout, nogil=True, num_threads=num_threads ):                         # Else, binary search for interval
+    v  = sign * xout[i]
+    lo = 0
+    hi = n - 2
+    while lo < hi:                                                                      # Find last interval starting at or before v, clamped to [0, n-2]
+      mid = (lo + hi + 1) // 2
+      if sign * x[mid] <= v:
+        lo = mid
+      else:
+        hi = mid - 1
+    outView[i] = lo + (xout[i] - x[lo]) / (x[lo+1] - x[lo])
+
+  return out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _buildTaps( const real_t [:] id, long n, double a = 0.0 ):
+  """
+  Compute neighbour indices and weights along an axis of length n
+
+  Arguments:
+    id (real_t) : Indices to interpolate to
+    n (long)    : Length of the axis
+
+  Keyword arguments:
+    a (float) : Cubic interpolation parameter. If zero (default), linear
+      interpolation is used
+
+  Returns:
+    tuple : Neighbour indices and weights, each of shape (id.size, taps)
+
+  """
+
+  cdef Py_ssize_t ntaps = 2 if a == 0.0 else 4
+  idx = np.empty( (id.shape[0], ntaps,), dtype=np.intp )
+  w   = np.empty( (id.shape[0], ntaps,), dtype=np.asarray(id).dtype )
+  cdef:
+    Py_ssize_t [:,::1] idxView = idx
+    real_t [:,::1] wView = w
+
+  with nogil:
+    if ntaps == 2:
+      linearTaps( id, n, idxView, wView )
+    else:
+      cubicTaps( id, n, <real_t> a, idxView, wView )
+
+  return idx, w
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gather1d( const data_t [:,::1] data, Py_ssize_t [:,::1] xi, real_t [:,::1] xw, unsigned char [:] xo,
+               data_t [:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of data using precomputed indices and weights
+
+  Data and output have a leading batch dimension; the loop is parallelized
+  over batch and output elements together. If fill is not empty, its first
+  element is written to out-of-bounds elements. If skipnan is set, NaN
+  neighbours are ignored and the remaining weights renormalized. The
+  loop uses num_threads threads, or the OpenMP default if not positive.
+  Linear interpolation without skipnan blends the two neighbours
+  directly; see blend2.
+
+  """
+
+  cdef:
+    Py_ssize_t b, i, ii, n
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t nx = xi.shape[0]
+    Py_ssize_t nt = xi.shape[1]
+    bint useFill = fill.shape[0] > 0
+    bint linear = nt == 2 and not skipnan
+    real_t acc, accW, v
+
+  num_threads = numThreads( num_threads )
+  for n in prange( nb * nx, nogil=True, num_threads=num_threads ):
+    b = n // nx
+    i = n % nx
+    if useFill and xo[i]:
+      out[b,i] = fill[0]
+    elif linear:                                                                        # Two neighbours, blended directly
+      out[b,i] = <data_t> blend2( <real_t> data[b,xi[i,0]], xw[i,0], <real_t> data[b,xi[i,1]], xw[i,1] )
+    else:
+      acc  = 0
+      accW = 0
+      for ii in range( nt ):
+        if xw[i,ii] != 0:
+          v = data[b, xi[i,ii]]
+          if not (skipnan and v != v):
+            acc  = acc  + v * xw[i,ii]
+            accW = accW + xw[i,ii]
+      if skipnan:
+        acc = acc / accW
+      out[b,i] = <data_t> acc
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gather2d( const data_t [:,:,::1] data, Py_ssize_t [:,::1] yi, real_t [:,::1] yw, unsigned char [:] yo,
+               Py_ssize_t [:,::1] xi, real_t [:,::1] xw, unsigned char [:] xo,
+               data_t [:,:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of data on a grid using precomputed indices and weights
+
+  Data and output have a leading batch dimension; the loop is parallelized
+  over batch and the outer output dimension together. See _gather1d for
+  the fill, skipnan, and num_threads arguments.
+
+  """
+
+  cdef:
+    Py_ssize_t b, i, j, ii, jj, n, y0, y1, x0, x1
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t ny = yi.shape[0]
+    Py_ssize_t nx = xi.shape[0]
+    Py_ssize_t nt = xi.shape[1]
+    bint useFill = fill.shape[0] > 0
+    bint linear = nt == 2 and not skipnan
+    real_t acc, accW, row, rowW, v, wy0, wy1
+
+  num_threads = numThreads( num_threads )
+  for n in prange( nb * ny, nogil=True, num_threads=num_threads ):
+    b   = n // ny
+    j   = n % ny
+    y0  = yi[j,0]
+    y1  = yi[j,1]
+    wy0 = yw[j,0]
+    wy1 = yw[j,1]
+    for i in range( nx ):
+      if useFill and (yo[j] or xo[i]):
+        out[b,j,i] = fill[0]
+      elif linear:                                                                      # Four neighbours, blended directly
+        x0 = xi[i,0]
+        x1 = xi[i,1]
+        out[b,j,i] = <data_t> blend2( blend2( <real_t> data[b,y0,x0], xw[i,0], <real_t> data[b,y0,x1], xw[i,1] ), wy0,
+                                      blend2( <real_t> data[b,y1,x0], xw[i,0], <real_t> data[b,y1,x1], xw[i,1] ), wy1 )
+      else:
+        acc  = 0
+        accW = 0
+        for jj in range( nt ):
+          if yw[j,jj] != 0:
+            row  = 0
+            rowW = 0
+            for ii in range( nt ):
+              if xw[i,ii] != 0:
+                v = data[b, yi[j,jj], xi[i,ii]]
+                if not (skipnan and v != v):
+                  row  = row  + v * xw[i,ii]
+                  rowW = rowW + xw[i,ii]
+            acc  = acc  + row  * yw[j,jj]
+            accW = accW + rowW * yw[j,jj]
+        if skipnan:
+          acc = acc / accW
+        out[b,j,i] = <data_t> acc
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gather3d( const data_t [:,:,:,::1] data, Py_ssize_t [:,::1] zi, real_t [:,::1] zw, unsigned char [:] zo,
+               Py_ssize_t [:,::1] yi, real_t [:,::1] yw, unsigned char [:] yo,
+               Py_ssize_t [:,::1] xi, real_t [:,::1] xw, unsigned char [:] xo,
+               data_t [:,:,:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of data on a grid using precomputed indices and weights
+
+  Data and output have a leading batch dimension; the loop is parallelized
+  over batch and the outer output dimension together. See _gather1d for
+  the fill, skipnan, and num_threads arguments.
+
+  """
+
+  cdef:
+    Py_ssize_t b, i, j, k, ii, jj, kk, n, z0, z1, y0, y1, x0, x1
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t nz = zi.shape[0]
+    Py_ssize_t ny = yi.shape[0]
+    Py_ssize_t nx = xi.shape[0]
+    Py_ssize_t nt = xi.shape[1]
+    bint useFill = fill.shape[0] > 0
+    bint linear = nt == 2 and not skipnan
+    real_t acc, accW, plane, planeW, row, rowW, v, wz0, wz1, wy0, wy1
+
+  num_threads = numThreads( num_threads )
+  for n in prange( nb * nz, nogil=True, num_threads=num_threads ):
+    b  = n // nz
+    k  = n % nz
+    z0  = zi[k,0]
+    z1  = zi[k,1]
+    wz0 = zw[k,0]
+    wz1 = zw[k,1]
+    for j in range( ny ):
+      y0  = yi[j,0]
+      y1  = yi[j,1]
+      wy0 = yw[j,0]
+      wy1 = yw[j,1]
+      for i in range( nx ):
+        if useFill and (zo[k] or yo[j] or xo[i]):
+          out[b,k,j,i] = fill[0]
+        elif linear:                                                                    # Eight neighbours, blended directly
+          x0 = xi[i,0]
+          x1 = xi[i,1]
+          out[b,k,j,i] = <data_t> blend2(
+            blend2( blend2( <real_t> data[b,z0,y0,x0], xw[i,0], <real_t> data[b,z0,y0,x1], xw[i,1] ), wy0,
+                    blend2( <real_t> data[b,z0,y1,x0], xw[i,0], <real_t> data[b,z0,y1,x1], xw[i,1] ), wy1 ), wz0,
+            blend2( blend2( <real_t> data[b,z1,y0,x0], xw[i,0], <real_t> data[b,z1,y0,x1], xw[i,1] ), wy0,
+                    blend2( <real_t> data[b,z1,y1,x0], xw[i,0], <real_t> data[b,z1,y1,x1], xw[i,1] ), wy1 ), wz1 )
+        else:
+          acc  = 0
+          accW = 0
+          for kk in range( nt ):
+            if zw[k,kk] != 0:
+              plane  = 0
+              planeW = 0
+              for jj in range( nt ):
+                if yw[j,jj] != 0:
+                  row  = 0
+                  rowW = 0
+                  for ii in range( nt ):
+                    if xw[i,ii] != 0:
+                      v = data[b, zi[k,kk], yi[j,jj], xi[i,ii]]
+                      if not (skipnan and v != v):
+                        row  = row  + v * xw[i,ii]
+                        rowW = rowW + xw[i,ii]
+                  plane  = plane  + row  * yw[j,jj]
+                  planeW = planeW + rowW * yw[j,jj]
+              acc  = acc  + plane  * zw[k,kk]
+              accW = accW + planeW * zw[k,kk]
+          if skipnan:
+            acc = acc / accW
+          out[b,k,j,i] = <data_t> acc
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gather2d_points( const data_t [:,:,::1] data, Py_ssize_t [:,::1] yi, real_t [:,::1] yw, unsigned char [:] yo,
+                      Py_ssize_t [:,::1] xi, real_t [:,::1] xw, unsigned char [:] xo,
+                      data_t [:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of data at points using precomputed indices and weights
+
+  Data and output have a leading batch dimension; the loop is parallelized
+  over batch and points together. See _gather1d for the fill, skipnan, and
+  num_threads arguments.
+
+  """
+
+  cdef:
+    Py_ssize_t b, i, ii, jj, n
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t npts = xi.shape[0]
+    Py_ssize_t nt = xi.shape[1]
+    bint useFill = fill.shape[0] > 0
+    real_t acc, accW, row, rowW, v
+
+  num_threads = numThreads( num_threads )
+  for n in prange( nb * npts, nogil=True, num_threads=num_threads ):
+    b = n // npts
+    i = n % npts
+    if useFill and (yo[i] or xo[i]):
+      out[b,i] = fill[0]
+    else:
+      acc  = 0
+      accW = 0
+      for jj in range( nt ):
+        if yw[i,jj] != 0:
+          row  = 0
+          rowW = 0
+          for ii in range( nt ):
+            if xw[i,ii] != 0:
+              v = data[b, yi[i,jj], xi[i,ii]]
+              if not (skipnan and v != v):
+                row  = row  + v * xw[i,ii]
+                rowW = rowW + xw[i,ii]
+          acc  = acc  + row  * yw[i,jj]
+          accW = accW + rowW * yw[i,jj]
+      if skipnan:
+        acc = acc / accW
+      out[b,i] = <data_t> acc
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gather3d_points( const data_t [:,:,:,::1] data, Py_ssize_t [:,::1] zi, real_t [:,::1] zw, unsigned char [:] zo,
+                      Py_ssize_t [:,::1] yi, real_t [:,::1] yw, unsigned char [:] yo,
+                      Py_ssize_t [:,::1] xi, real_t [:,::1] xw, unsigned char [:] xo,
+                      data_t [:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of data at points using precomputed indices and weights
+
+  Data and output have a leading batch dimension; the loop is parallelized
+  over batch and points together. See _gather1d for the fill, skipnan, and
+  num_threads arguments.
+
+  """
+
+  cdef:
+    Py_ssize_t b, i, ii, jj, kk, n
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t npts = xi.shape[0]
+    Py_ssize_t nt = xi.shape[1]
+    bint useFill = fill.shape[0] > 0
+    real_t acc, accW, plane, planeW, row, rowW, v
+
+  num_threads = numThreads( num_threads )
+  for n in prange( nb * npts, nogil=True, num_threads=num_threads ):
+    b = n // npts
+    i = n % npts
+    if useFill and (zo[i] or yo[i] or xo[i]):
+      out[b,i] = fill[0]
+    else:
+      acc  = 0
+      accW = 0
+      for kk in range( nt ):
+        if zw[i,kk] != 0:
+          plane  = 0
+          planeW = 0
+          for jj in range( nt ):
+            if yw[i,jj] != 0:
+              row  = 0
+              rowW = 0
+              for ii in range( nt ):
+                if xw[i,ii] != 0:
+                  v = data[b, zi[i,kk], yi[i,jj], xi[i,ii]]
+                  if not (skipnan and v != v):
+                    row  = row  + v * xw[i,ii]
+                    rowW = rowW + xw[i,ii]
+              plane  = plane  + row  * yw[i,jj]
+              planeW = planeW + rowW * yw[i,jj]
+          acc  = acc  + plane  * zw[i,kk]
+          accW = accW + planeW * zw[i,kk]
+      if skipnan:
+        acc = acc / accW
+      out[b,i] = <data_t> acc
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gathernd( const data_t [:,::1] data, Py_ssize_t [:,::1] idx, real_t [:,::1] w, unsigned char [:] oob,
+               Py_ssize_t [:] offsets, Py_ssize_t [:] counts, Py_ssize_t [:] strides,
+               data_t [:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of N-dimensional data on a grid using precomputed indices and weights
+
+  Data (with its spatial dimensions flattened) and output (with the grid
+  flattened) have a leading batch dimension. The indices, weights, and
+  out-of-bounds flags of all dimensions are stacked, with those of
+  dimension a starting at row offsets[a] and counts[a] rows long. The loop
+  is parallelized over batch and output elements together. See _gather1d
+  for the fill, skipnan, and num_threads arguments.
+
+  """
+
+  cdef:
+    int a
+    int ndim = offsets.shape[0]
+    Py_ssize_t b, i, n, rem
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t nout = out.shape[1]
+    bint useFill = fill.shape[0] > 0
+    bint bad
+    Py_ssize_t *rows
+    Py_ssize_t [:,::1] rowbuf
+
+  num_threads = numThreads( num_threads )
+  rowbuf      = np.empty( (num_threads, ndim), dtype = np.intp )                        # Rows buffer of each thread
+  for n in prange( nb * nout, nogil=True, num_threads=num_threads ):
+    rows = &rowbuf[threadid(), 0]
+    b    = n // nout
+    i    = n % nout
+    rem  = i
+    bad  = False
+    for a in range( ndim-1, -1, -1 ):                                                   # Grid position along each dimension
+      rows[a] = offsets[a] + rem % counts[a]
+      rem     = rem // counts[a]
+      bad     = bad or oob[rows[a]]
+    if useFill and bad:
+      out[b,i] = fill[0]
+    else:
+      out[b,i] = <data_t> blendCorners( data, b, rows, ndim, idx, w, strides, skipnan )
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def _gathernd_points( const data_t [:,::1] data, Py_ssize_t [:,::1] idx, real_t [:,::1] w, unsigned char [:] oob,
+                      Py_ssize_t [:] offsets, Py_ssize_t [:] counts, Py_ssize_t [:] strides,
+                      data_t [:,::1] out, data_t [:] fill, bint skipnan, int num_threads = 0 ):
+  """
+  Blend neighbours of N-dimensional data at points using precomputed indices and weights
+
+  Arguments are as for _gathernd, with out holding one element per point.
+
+  """
+
+  cdef:
+    int a
+    int ndim = offsets.shape[0]
+    Py_ssize_t b, i, n
+    Py_ssize_t nb = data.shape[0]
+    Py_ssize_t nout = out.shape[1]
+    bint useFill = fill.shape[0] > 0
+    bint bad
+    Py_ssize_t *rows
+    Py_ssize_t [:,::1] rowbuf
+
+  num_threads = numThreads( num_threads )
+  rowbuf      = np.empty( (num_threads, ndim), dtype = np.intp )                        # Rows buffer of each thread
+  for n in prange( nb * nout, nogil=True, num_threads=num_threads ):
+    rows = &rowbuf[threadid(), 0]
+    b    = n // nout
+    i    = n % nout
+    bad  = False
+    for a in range( ndim ):
+      rows[a] = offsets[a] + i
+      bad     = bad or oob[rows[a]]
+    if useFill and bad:
+      out[b,i] = fill[0]
+    else:
+      out[b,i] = <data_t> blendCorners( data, b, rows, ndim, idx, w, strides, skipnan )
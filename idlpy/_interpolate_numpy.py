@@ -0,0 +1,311 @@
+"""
+Vectorised NumPy versions of the kernels in _interpolate.pyx
+
+Used by interpolate.py when the compiled extension is not available. The
+functions take the same arguments and return the same results as their
+compiled counterparts, but loop over neighbours (or axes) instead of over
+output elements, doing the per-element work with NumPy array operations.
+The num_threads arguments are accepted for compatibility and ignored.
+
+"""
+import itertools
+import numpy as np
+
+def _cubicWeight( s, a ):
+  """
+  Cubic convolution kernel of Park and Schowengerdt (1983)
+
+  Arguments:
+    s (numpy.ndarray) : Distance from the interpolation point
+    a : Interpolation parameter, in type of s; IDL CUBIC keyword value
+
+  Returns:
+    numpy.ndarray : Weight for samples at distances s
+
+  """
+
+  s = np.abs( s )
+  return np.where( s <= 1, ((a + 2) * s - (a + 3)) * s * s + 1,
+         np.where( s <  2, ((a * s - 5 * a) * s + 8 * a) * s - 4 * a, 0 ) ).astype( s.dtype )
+
+def _buildTaps( id, n, a = 0.0 ):
+  """
+  Compute neighbour indices and weights along an axis of length n
+
+  Arguments:
+    id (numpy.ndarray) : Indices to interpolate to
+    n (int)            : Length of the axis
+
+  Keyword arguments:
+    a (float) : Cubic interpolation parameter. If zero (default), linear
+      interpolation is used
+
+  Returns:
+    tuple : Neighbour indices and weights, each of shape (id.size, taps)
+
+  """
+
+  id = np.asarray( id )
+  if a == 0.0:                                                                          # Linear interpolation
+    i0  = np.clip( id.astype( np.intp ), 0, n-1 )                                       # Truncate toward zero and clamp, as checkBound
+    i1  = np.clip( i0 + 1, 0, n-1 )
+    d   = np.where( (id >= i0) & (id < i1), id - i0, 0 ).astype( id.dtype )             # Fraction is zero outside of axis, as checkIndex
+    i1  = np.where( d == 0, i0, i1 )                                                    # Unused neighbour points at used one, as linearTaps
+    idx = np.stack( (i0, i1), axis = 1 )
+    w   = np.stack( (1 - d, d), axis = 1 )
+  else:                                                                                 # Cubic convolution
+    inside = (id >= 0) & (id < n-1)
+    i0     = np.where( id < 0, 0, np.where( inside, np.floor( np.where( inside, id, 0 ) ), n-1 ) ).astype( np.intp )
+    t      = np.where( inside, id - i0, 0 ).astype( id.dtype )
+    a      = id.dtype.type( a )
+    idx    = np.stack( [np.clip( i0 - 1 + k, 0, n-1 ) for k in range(4)], axis = 1 )  # Taps at i0-1, i0, i0+1, i0+2
+    w      = np.stack( [_cubicWeight( t - (k - 1), a ) for k in range(4)], axis = 1 )
+    idx    = np.where( w == 0, idx[:,1:2], idx )                                      # Unused neighbours point at i0, as cubicTaps
+  return np.ascontiguousarray( idx ), np.ascontiguousarray( w )
+
+def _locate( x, xout, num_threads = 0, eps = np.finfo( np.float64 ).eps ):
+  """
+  Convert coordinates to fractional indices along a monotonic axis
+
+  Arguments:
+    x (numpy.ndarray)    : Coordinates of the axis; strictly monotonic
+    xout (numpy.ndarray) : Coordinates to locate
+
+  Keyword arguments:
+    eps (float) : Relative precision the coordinates were given in; x is
+      taken as uniform if it differs from uniform spacing by no more than
+      the rounding error of its largest value
+
+  Returns:
+    numpy.ndarray : Fractional indices of xout along x, type of x
+
+  """
+
+  x    = np.asarray( x )
+  xout = np.asarray( xout )
+  n    = x.shape[0]
+  if n < 2:
+    raise Exception( 'Coordinate array must have at least two elements' )
+  sign = 1 if x[n-1] > x[0] else -1                                                    # Direction of axis
+  if np.any( sign * np.diff( x ) <= 0 ):
+    raise Exception( 'Coordinates must be strictly monotonic' )
+  dx  = (x[n-1] - x[0]) / (n - 1)                                                       # Spacing if uniform
+  tol = max( 1e-6 * sign * dx, 4 * eps * max( abs( x[0] ), abs( x[n-1] ) ) )           # Spacing tolerance; rounding error of coordinates
+  if np.all( np.abs( x - (x[0] + np.arange( n ) * dx) ) <= tol ):                       # If uniform, index follows directly from spacing
+    return ((xout - x[0]) / dx).astype( x.dtype )
+  lo = np.clip( np.searchsorted( sign * x, sign * xout, side = 'right' ) - 1, 0, n-2 )  # Last interval starting at or before xout
+  return (lo + (xout - x[lo]) / (x[lo+1] - x[lo])).astype( x.dtype )
+
+def _contract( val, idx, w, axis ):
+  """
+  Blend the neighbours along one axis of an array
+
+  Arguments:
+    val (numpy.ndarray) : Values to blend, in the type of the weights
+    idx (numpy.ndarray) : Neighbour indices, shape (n, taps)
+    w (numpy.ndarray)   : Neighbour weights, shape (n, taps)
+    axis (int)          : Axis of val to blend along
+
+  Returns:
+    numpy.ndarray : Blended values; axis has length n
+
+  """
+
+  shape       = [1] * val.ndim                                                          # Shape to broadcast weights along axis
+  shape[axis] = idx.shape[0]
+  acc = 0
+  for t in range( idx.shape[1] ):                                                       # Iterate over neighbours
+    wt  = w[:,t].reshape( shape )
+    v   = np.take( val, idx[:,t], axis = axis )
+    acc = acc + np.multiply( v, wt, out = np.zeros_like( v ), where = wt != 0 )        # Neighbours with zero weight do not contribute, even if inf
+  return acc
+
+def _blendGrid( data, taps, skipnan ):
+  """
+  Blend neighbours of data on the grid formed by the taps of each axis
+
+  Arguments:
+    data (numpy.ndarray) : Data with leading batch dimension
+    taps (list) : (indices, weights) for each axis of data after the first
+    skipnan (bool) : Skip NaN neighbours and renormalize weights
+
+  Returns:
+    numpy.ndarray : Interpolated values, in the type of the weights
+
+  """
+
+  dtype = taps[0][1].dtype
+  if skipnan:
+    good = ~np.isnan( data )
+    acc  = np.where( good, data, 0 ).astype( dtype )
+    accW = good.astype( dtype )
+  else:
+    acc  = data.astype( dtype )
+  for axis in range( len(taps), 0, -1 ):                                                # Blend innermost axis first, as the compiled kernels
+    idx, w = taps[axis-1]
+    acc    = _contract( acc, idx, w, axis )
+    if skipnan:
+      accW = _contract( accW, idx, w, axis )
+  if skipnan:
+    with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+      acc = acc / accW                                                                  # All NaN neighbours gives NaN
+  return acc
+
+def _blendPoints( data, taps, strides, skipnan ):
+  """
+  Blend neighbours of data at points
+
+  Arguments:
+    data (numpy.ndarray) : Data with leading batch dimension, spatial
+      dimensions flattened
+    taps (list) : (indices, weights) for each spatial dimension, one row
+      per point
+    strides (sequence) : Element stride of each spatial dimension
+    skipnan (bool) : Skip NaN neighbours and renormalize weights
+
+  Returns:
+    numpy.ndarray : Interpolated values, shape (batch, points), in the
+      type of the weights
+
+  """
+
+  dtype = taps[0][1].dtype
+  acc   = 0
+  accW  = 0
+  for corner in itertools.product( range( taps[0][0].shape[1] ), repeat = len(taps) ):  # Iterate over all neighbours
+    wt  = 1
+    off = 0
+    for (idx, w), t, s in zip( taps, corner, strides ):
+      wt  = wt  * w[:,t]
+      off = off + idx[:,t] * s
+    val  = data[:,off].astype( dtype )
+    use  = wt != 0                                                                      # Neighbours with zero weight do not contribute
+    if skipnan:
+      use  = use & ~np.isnan( val )
+      accW = accW + np.where( use, wt, 0 )
+    acc = acc + np.multiply( val, wt, out = np.zeros_like( val ), where = use )
+  if skipnan:
+    with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+      acc = acc / accW                                                                  # All NaN neighbours gives NaN
+  return acc
+
+def _store( out, res, bad, fill ):
+  """
+  Write interpolated values to out, converting to the type of out
+
+  Arguments:
+    out (numpy.ndarray) : Output array with leading batch dimension
+    res (numpy.ndarray) : Interpolated values
+    bad (numpy.ndarray) : Out-of-bounds flags, shape of out without batch
+    fill (numpy.ndarray) : If not empty, first element is written to
+      out-of-bounds elements
+
+  Returns:
+    None
+
+  """
+
+  with np.errstate( invalid = 'ignore' ):
+    out[...] = res                                                                      # Truncates toward zero for integer types, as a C cast
+  if fill.shape[0] > 0:
+    out[:, bad] = fill[0]
+
+def _gridFlags( *flags ):
+  """Combine per-axis out-of-bounds flags to flags on the grid"""
+
+  bad = np.zeros( tuple( f.shape[0] for f in flags ), dtype = bool )
+  for axis, f in enumerate( flags ):
+    shape       = [1] * len(flags)
+    shape[axis] = f.shape[0]
+    bad         = bad | f.astype( bool ).reshape( shape )
+  return bad
+
+def _gather1d( data, xi, xw, xo, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of data using precomputed indices and weights
+
+  Data and output have a leading batch dimension. If fill is not empty,
+  its first element is written to out-of-bounds elements. If skipnan is
+  set, NaN neighbours are ignored and the remaining weights renormalized.
+
+  """
+
+  _store( out, _blendGrid( data, [(xi, xw)], skipnan ), _gridFlags( xo ), fill )
+
+def _gather2d( data, yi, yw, yo, xi, xw, xo, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of data on a grid using precomputed indices and weights
+
+  See _gather1d for the fill and skipnan arguments.
+
+  """
+
+  _store( out, _blendGrid( data, [(yi, yw), (xi, xw)], skipnan ), _gridFlags( yo, xo ), fill )
+
+def _gather3d( data, zi, zw, zo, yi, yw, yo, xi, xw, xo, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of data on a grid using precomputed indices and weights
+
+  See _gather1d for the fill and skipnan arguments.
+
+  """
+
+  res = _blendGrid( data, [(zi, zw), (yi, yw), (xi, xw)], skipnan )
+  _store( out, res, _gridFlags( zo, yo, xo ), fill )
+
+def _gather2d_points( data, yi, yw, yo, xi, xw, xo, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of data at points using precomputed indices and weights
+
+  See _gather1d for the fill and skipnan arguments.
+
+  """
+
+  nb  = data.shape[0]
+  res = _blendPoints( data.reshape( nb, -1 ), [(yi, yw), (xi, xw)], (data.shape[2], 1), skipnan )
+  _store( out, res, yo.astype( bool ) | xo.astype( bool ), fill )
+
+def _gather3d_points( data, zi, zw, zo, yi, yw, yo, xi, xw, xo, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of data at points using precomputed indices and weights
+
+  See _gather1d for the fill and skipnan arguments.
+
+  """
+
+  nb      = data.shape[0]
+  strides = (data.shape[2] * data.shape[3], data.shape[3], 1)
+  res     = _blendPoints( data.reshape( nb, -1 ), [(zi, zw), (yi, yw), (xi, xw)], strides, skipnan )
+  _store( out, res, zo.astype( bool ) | yo.astype( bool ) | xo.astype( bool ), fill )
+
+def _gathernd( data, idx, w, oob, offsets, counts, strides, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of N-dimensional data on a grid using precomputed indices and weights
+
+  Data (with its spatial dimensions flattened) and output (with the grid
+  flattened) have a leading batch dimension. The indices, weights, and
+  out-of-bounds flags of all dimensions are stacked, with those of
+  dimension a starting at row offsets[a] and counts[a] rows long. See
+  _gather1d for the fill and skipnan arguments.
+
+  """
+
+  rows  = [slice( o, o + c ) for o, c in zip( offsets, counts )]                        # Rows of stacked taps for each dimension
+  shape = [data.shape[1] // strides[0]] + [s0 // s1 for s0, s1 in zip( strides[:-1], strides[1:] )]   # Spatial shape from strides
+  res   = _blendGrid( data.reshape( [data.shape[0]] + shape ), [(idx[r], w[r]) for r in rows], skipnan )
+  _store( out, res.reshape( out.shape ), _gridFlags( *[oob[r] for r in rows] ).ravel(), fill )
+
+def _gathernd_points( data, idx, w, oob, offsets, counts, strides, out, fill, skipnan, num_threads = 0 ):
+  """
+  Blend neighbours of N-dimensional data at points using precomputed indices and weights
+
+  Arguments are as for _gathernd, with out holding one element per point.
+
+  """
+
+  rows = [slice( o, o + c ) for o, c in zip( offsets, counts )]                         # Rows of stacked taps for each dimension
+  res  = _blendPoints( data, [(idx[r], w[r]) for r in rows], strides, skipnan )
+  bad  = np.zeros( out.shape[1], dtype = bool )
+  for r in rows:
+    bad = bad | oob[r].astype( bool )
+  _store( out, res, bad, fill )
@@ -1,16 +1,409 @@
+import asyncio
+import atexit
+import csv
+import hashlib
+import heapq
+import itertools
+import json
 import logging
-import os, re, time
+import os, re, selectors, shutil, sys, tempfile, time
 from datetime import datetime, timedelta
+from collections import deque
 from multiprocessing import cpu_count
-from threading import Thread
-from subprocess import Popen, PIPE
+from concurrent.futures import Executor, Future
+from queue import Queue, Empty
+from threading import Thread, Lock, Event
+from subprocess import Popen, PIPE, STDOUT
 
-NCPU = cpu_count()
+import numpy as np
+
+NCPU    = cpu_count()
+IDL_EXE = os.environ.get( 'IDLPY_IDL', 'idl' );                                        # IDL executable; may be set to a stand-in, e.g., benchmarks/fake_idl.py
+
+IDL_TYPES = {np.dtype(np.uint8)     : 1,  np.dtype(np.int16)      : 2,
+             np.dtype(np.int32)     : 3,  np.dtype(np.float32)    : 4,
+             np.dtype(np.float64)   : 5,  np.dtype(np.complex64)  : 6,
+             np.dtype(np.complex128): 9,  np.dtype(np.uint16)     : 12,
+             np.dtype(np.uint32)    : 13, np.dtype(np.int64)      : 14,
+             np.dtype(np.uint64)    : 15};                                              # IDL type codes of numpy types that can be passed to and from IDL
+NP_TYPES  = {val : key for key, val in IDL_TYPES.items()};                              # numpy types of IDL type codes
+
+###############################################################################
+def _idlEnv( log ):
+  """
+  Build the environment for an IDL process
+
+  Arguments:
+    log : Logger to report the startup file to
+
+  Returns:
+    dict : Copy of the user's environment with IDL_STARTUP set to
+      ~/startup.pro if not already set and the file exists
+
+  """
+
+  my_env = os.environ.copy();                                                           # Copy user's environment
+  if ('IDL_STARTUP' not in my_env):                                                     # If noe IDL_STARTUP set in environment
+    startup = os.path.join( os.path.expanduser('~'), 'startup.pro' );                   # Assume startup.pro in home directory
+    if os.path.isfile( startup ):                                                       # If the assumed file exists
+      my_env['IDL_STARTUP'] = startup;                                                  # Use it for start up
+
+  if ('IDL_STARTUP' in my_env):
+    log.debug( 'Using startup file : {}'.format(my_env['IDL_STARTUP']))
+  return my_env
+
+###############################################################################
+def _cgroupValue( controller, name ):
+  """
+  Read a file of the cgroup of this process
+
+  Arguments:
+    controller (str) : cgroup v1 controller of the file; e.g., cpu
+    name (str) : File name; e.g., cpu.max (v2) or cpu.cfs_quota_us (v1)
+
+  Returns:
+    str : Contents of the file, or None if it does not exist
+
+  """
+
+  paths = {};                                                                           # cgroup path of each v1 controller; '' for v2
+  try:
+    with open( '/proc/self/cgroup' ) as fid:
+      for line in fid:
+        hid, controllers, path = line.rstrip('\n').split( ':', 2 );
+        for key in controllers.split(','):
+          paths[key] = path.lstrip('/');
+  except (OSError, ValueError):
+    pass
+
+  root  = '/sys/fs/cgroup';
+  files = [os.path.join( root, controller, paths.get(controller, ''), name ),
+           os.path.join( root, controller, name ),
+           os.path.join( root, paths.get('', ''), name ),
+           os.path.join( root, name )];                                                 # v1 then v2 locations; cgroup root if in a namespace
+  for path in files:
+    try:
+      with open( path ) as fid:
+        return fid.read().strip()
+    except OSError:
+      pass
+  return None
+
+###############################################################################
+def _cpuLimit():
+  """
+  Number of CPUs this process may use
+
+  Returns:
+    float : The number of CPUs in the affinity mask of the process, or the
+      cgroup CPU quota if lower
+
+  """
+
+  try:
+    ncpu = len( os.sched_getaffinity(0) );
+  except AttributeError:                                                                # Not available on all platforms
+    ncpu = NCPU;
+
+  quota = None;
+  try:
+    val = _cgroupValue( 'cpu', 'cpu.max' );                                             # cgroup v2: 'quota period', quota may be max
+    if val is not None:
+      val = val.split();
+      if val[0] != 'max':
+        quota = int(val[0]) / int(val[1]);
+    else:                                                                               # cgroup v1: quota is -1 if no limit
+      val    = _cgroupValue( 'cpu', 'cpu.cfs_quota_us' );
+      period = _cgroupValue( 'cpu', 'cpu.cfs_period_us' );
+      if val is not None and period is not None and int(val) > 0:
+        quota = int(val) / int(period);
+  except (ValueError, IndexError, ZeroDivisionError):
+    pass
+  return ncpu if quota is None else min( ncpu, quota )
+
+###############################################################################
+def _availableMemory():
+  """
+  Memory available to start new processes, in bytes
+
+  Returns:
+    int : Available memory of the system, or the room left under the
+      cgroup memory limit if lower; None if unknown
+
+  """
+
+  avail = None;
+  try:
+    with open( '/proc/meminfo' ) as fid:
+      for line in fid:
+        if line.startswith( 'MemAvailable:' ):
+          avail = int( line.split()[1] ) * 1024;
+  except (OSError, ValueError):
+    pass
+
+  for limit, usage in (('memory.max', 'memory.current'), ('memory.limit_in_bytes', 'memory.usage_in_bytes')):
+    limit, usage = _cgroupValue( 'memory', limit ), _cgroupValue( 'memory', usage );
+    if limit is None or usage is None:
+      continue
+    try:
+      room = int(limit) - int(usage);                                                   # No limit is 'max' in v2, fails int()
+    except ValueError:
+      break
+    if room < 2**60:                                                                    # No limit in v1 is a huge number
+      avail = room if avail is None else min( avail, room );
+    break
+  return avail
+
+###############################################################################
+class _PipeReader( object ):
+  """
+  Read the output pipes of all running IDLJobs in a single thread
+
+  Pipes are registered with a selector that one daemon thread waits on,
+  so the number of threads does not grow with the number of running
+  jobs. Output is read in blocks and passed, as whole lines, to a
+  callback for each pipe; another callback is called when the pipe closes.
+  An exception raised by a callback is logged and does not stop the
+  thread. The thread, selector, and wake pipe are created on first use,
+  and again in a forked child, where the thread of the parent does not
+  exist.
+
+  """
+
+  def __init__(self):
+    self._lock    = Lock();
+    self._sel     = None;
+    self._pending = [];                                                                 # Pipes to register, added by the reader thread
+    self._thread  = None;
+    self._wakeR   = None;                                                               # Pipe used to wake the reader for new registrations
+    self._wakeW   = None;
+
+  #############################################################################
+  def register(self, pipe, onData, onClose):
+    """
+    Start reading a pipe
+
+    Arguments:
+      pipe : Binary file object to read from
+      onData : Function called with each block of output, as bytes of
+        one or more whole lines
+      onClose : Function called with no arguments when the pipe closes
+
+    Returns:
+      None
+
+    """
+
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():                           # Start reader on first use, or if it died
+        self._start();
+      self._pending.append( (pipe, onData, onClose,) );
+      os.write( self._wakeW, b'\0' );
+
+  #############################################################################
+  def _start(self):
+    """Create the selector and wake pipe, and start the reader thread"""
+
+    self._reset();
+    self._sel                = selectors.DefaultSelector();
+    self._wakeR, self._wakeW = os.pipe();
+    self._sel.register( self._wakeR, selectors.EVENT_READ );
+    self._thread             = Thread( target = self._run, args = (self._sel, self._wakeR,), name = 'IDLPipeReader', daemon = True );
+    self._thread.start();
+
+  #############################################################################
+  def _afterFork(self):
+    """
+    Reset the reader in a forked child
+
+    The reader thread of the parent does not exist in the child, and the
+    selector and wake pipe are shared with the parent, so they are
+    dropped and created again on the next register().
+
+    """
+
+    self._lock = Lock();                                                                # May have been held by another thread when forked
+    self._reset();
+
+  #############################################################################
+  def _reset(self):
+    """Drop the selector, wake pipe, and pipes of a reader that is not running"""
+
+    if self._sel is not None:
+      self._sel.close();
+    for fd in (self._wakeR, self._wakeW):
+      if fd is not None:
+        os.close( fd );
+    self._sel     = None;
+    self._pending = [];
+    self._thread  = None;
+    self._wakeR   = self._wakeW = None;
+
+  #############################################################################
+  def _run(self, sel, wakeR):
+    """Wait for output on any pipe and dispatch it"""
+
+    while True:
+      for key, events in sel.select():
+        if key.fileobj == wakeR:                                                        # If woken for new registrations
+          os.read( wakeR, 4096 );
+          with self._lock:
+            pending, self._pending = self._pending, [];
+          for pipe, onData, onClose in pending:
+            sel.register( pipe, selectors.EVENT_READ, [b'', onData, onClose] );         # Data is partial line, and callbacks
+          continue
+
+        state = key.data
+        data  = os.read( key.fd, 65536 );
+        if data:
+          data = state[0] + data;
+          end  = data.rfind( b'\n' ) + 1;                                               # End of last whole line
+          state[0] = data[end:];                                                        # Keep incomplete last line
+          if end > 0:
+            self._call( state[1], data[:end] );
+        else:                                                                           # Pipe closed
+          if state[0]:
+            self._call( state[1], state[0] );
+          sel.unregister( key.fileobj );
+          key.fileobj.close();
+          self._call( state[2] );
+
+  #############################################################################
+  @staticmethod
+  def _call(fn, *args):
+    """Call a callback, logging any exception so the reader keeps running"""
+
+    try:
+      fn( *args );
+    except Exception:
+      logging.getLogger(__name__).exception( 'Error in IDL output callback' );
+
+_READER = _PipeReader();                                                                # Shared reader for all IDLJobs
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork( after_in_child = _READER._afterFork );                           # Reader thread does not exist in a forked child
+
+###############################################################################
+class _LogWriter( object ):
+  """
+  Log the output of IDLJobs from a single thread
+
+  Lines are handed over in blocks through a queue, so the thread reading
+  the output pipes does not wait for logging handlers; it keeps draining
+  the pipes, so IDL does not stall on a full pipe while output is logged.
+  Queued lines are flushed when a job is waited on, and at exit.
+
+  """
+
+  def __init__(self):
+    self._queue  = Queue();
+    self._lock   = Lock();
+    self._thread = None;
+
+  #############################################################################
+  def _afterFork(self):
+    """Reset the writer in a forked child, where its thread does not exist"""
+
+    self._queue  = Queue();
+    self._lock   = Lock();
+    self._thread = None;
+
+  #############################################################################
+  def put(self, log, level, lines):
+    """
+    Queue lines to be logged
+
+    Arguments:
+      log : Logger to log to
+      level : Level to log at
+      lines (list) : Lines to log, as bytes or str
+
+    Returns:
+      None
+
+    """
+
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():                           # Start writer on first use, or if it died
+        self._thread = Thread( target = self._run, name = 'IDLLogWriter', daemon = True );
+        self._thread.start();
+    self._queue.put( (log, level, lines,) );
+
+  #############################################################################
+  def flush(self):
+    """
+    Block until all lines queued so far have been logged
+
+    Lines queued by other jobs while waiting are not waited for, so this
+    returns even if output keeps arriving.
+
+    """
+
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():
+        return
+    done = Event();
+    self._queue.put( (None, None, done,) );                                             # Set by the writer once it gets here
+    done.wait();
+
+  #############################################################################
+  def _run(self):
+    """Log lines as they are queued"""
+
+    while True:
+      log, level, lines = self._queue.get();
+      if log is None:                                                                   # Flush marker
+        lines.set();
+        continue
+      for line in lines:
+        try:
+          if isinstance(line, bytes):
+            line = line.decode( errors = 'replace' );
+          log.log( level, line.rstrip() );
+        except Exception:                                                               # E.g., a failing handler; keep logging other lines
+          pass
+
+_WRITER = _LogWriter();                                                                 # Shared log writer for all IDLJobs
+atexit.register( _WRITER.flush );                                                       # Log all queued output before exit
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork( after_in_child = _WRITER._afterFork );                           # Writer thread does not exist in a forked child
 
 ###############################################################################
 class IDLJob( object ):
   _finishedMSG = 'spawnIDL FINISHED!!!';                                                # Custom message to signal that IDL process completed successfully
-  def __init__(self, cmd, _UTC=False, _STDOUTLVL=logging.INFO, _STDERRLVL=logging.DEBUG, **kwargs):
+  _finishedB   = _finishedMSG.encode();                                                 # As bytes, to search output blocks
+  _finishedCMD = "MESSAGE, 'spawnIDL ' + 'FINISHED!!!', /CONTINUE";                     # Message built by concatenation so an echoed command does not match it
+  def __init__(self, cmd, _UTC=False, _STDOUTLVL=logging.INFO, _STDERRLVL=logging.DEBUG, _OUTPUTS=None, _TMPDIR=None, _INPUTS=None, _OUTFILES=None,
+                     _LOGFILE=None, _TAIL=0, _RATELIMIT=None, **kwargs):
+    """
+    Arguments:
+      cmd (str) : IDL command to run as string with all arguments
+
+    Keyword arguments:
+      _UTC (bool) : Set if datetime values are UTC
+      _STDOUTLVL : Level to log IDL stdout at
+      _STDERRLVL : Level to log IDL stderr at
+      _OUTPUTS (list) : Names of IDL array variables to return. When the
+        job finishes successfully, the outputs attribute is a dict of
+        np.memmap of these variables
+      _TMPDIR (str) : Directory for the files that arrays are passed
+        through; default is the system temporary directory
+      _INPUTS (list) : Paths of files read by the command that are not
+        passed as variables; used to key the IDLCache
+      _OUTFILES (list) : Paths of files written by the command; stored
+        in, and restored from, the IDLCache
+      _LOGFILE (str) : If set, IDL output is appended to this file, as
+        is, instead of being logged. The file is opened when the job
+        starts, so an error opening it is raised by start()
+      _TAIL (int) : Number of the last lines of output to keep, for
+        tail(); default is 0, to keep none
+      _RATELIMIT (float) : If set, maximum number of lines of output per
+        second to log; the number of lines not logged is logged when the
+        job finishes
+      All variables required by IDL command; see _parseArgs. numpy
+        arrays are passed through memory-mapped files
+
+    """
+
     self.log        = logging.getLogger(__name__);                                         # Get a logger
     self.IDLcmd     = None;                                                                # Initialize IDLcmd to None
     self.fullcmd    = None;                                                                # Initialize fullcmd to None
@@ -20,14 +413,45 @@ class IDLJob( object ):
     self._STDOUTLVL = _STDOUTLVL
     self._STDERRLVL = _STDERRLVL
     self._proc      = None;
-    self._stdout    = None;
-    self._stderr    = None;
+    self._session   = None;
+    self._runner    = None;
+    self._callbacks = [];                                                                  # Functions to call when job finishes
+    self._finished  = False;
+    self._nopen     = 0;                                                                   # Number of output pipes still open
+    self._cblock    = Lock();
+    self._done      = Event();                                                             # Set when job finishes
+    self._outputs   = list( _OUTPUTS or [] );                                              # Names of IDL variables to return
+    self._tmpdir    = None;                                                                # Directory for array files, created when needed
+    self._tmproot   = _TMPDIR;
+    self.outputs    = None;                                                                # Output arrays, set when job finishes
+    self.returncode = None;                                                                # Exit status of IDL process; None if run in a session
+    self.submitTime = None;                                                                # time.time() when submitted to an IDLExecutor
+    self.startTime  = None;                                                                # time.time() when started
+    self.endTime    = None;                                                                # time.time() when finished
+    self.cpuUser    = None;                                                                # User CPU time of IDL process, in seconds
+    self.cpuSystem  = None;                                                                # System CPU time of IDL process, in seconds
+    self.maxRSS     = None;                                                                # Peak resident set size of IDL process, in bytes
+    self.cached     = False;                                                               # Set if result was taken from an IDLCache
+    self._inputs    = list( _INPUTS or [] );                                               # Files read by command, for cache key
+    self._outfiles  = list( _OUTFILES or [] );                                             # Files written by command, for cache
+    self._cmd       = cmd;                                                                 # Command and variables, for cache key
+    self._kwargs    = kwargs;
+    self._cacheKey  = None;                                                                # Set by IDLCache.key()
+    self._tail      = deque( maxlen = _TAIL or 0 );                                        # Last lines of output
+    self._logpath   = _LOGFILE;
+    self._logfile   = None;                                                                # Opened when job starts
+    self._rate      = _RATELIMIT;
+    self._tokens    = None;                                                                # Lines that may be logged now, and time of last update
+    self._tokenTime = None;
+    self._dropped   = 0;                                                                   # Lines not logged due to rate limit
     self._parseArgs( cmd, **kwargs );                                                   # Parse input arguments
 
   #############################################################################
-  def start(self, nowait = False):
+  def start(self, nowait = False, session = None):
     """
-    Start the IDL subprocess and threads that pipe stdout and stderr to a logger
+    Start the IDL subprocess, piping its stdout and stderr to a logger
+
+    The output of all jobs is read by one shared thread.
 
     Arguments:
       None
@@ -38,31 +462,35 @@ class IDLJob( object ):
                 False if ran. If set to True, returns None right away.
                 DEFAULT is to block until process finished and return the
                 value of failed attribute
+      session (IDLSession) : If set, run the job in this running IDL
+                session instead of spawning a new IDL process
 
     Retunrs:
       bool : True if IDL process was success, False otherwise
 
     """
 
-    self.failed = True;                                                                 # Set failed to True, will be set to false by threads if completes
-    my_env = os.environ.copy();                                                         # Copy user's environment
-    if ('IDL_STARTUP' not in my_env):                                                   # If noe IDL_STARTUP set in environment
-        startup = os.path.join( os.path.expanduser('~'), 'startup.pro' );               # Assume startup.pro in home directory
-        if os.path.isfile( startup ):                                                   # If the assumed file exists
-            my_env['IDL_STARTUP'] = startup;                                            # Use it for start up
-
-    if ('IDL_STARTUP' in my_env):
-        self.log.debug( 'Using startup file : {}'.format(my_env['IDL_STARTUP']))
+    self.failed    = True;                                                              # Set failed to True, will be set to false by threads if completes
+    self._finished = False;
+    self._session  = session
+    self.returncode = None;
+    self.cpuUser    = self.cpuSystem = self.maxRSS = None;
+    self.startTime  = time.time();
+    self._done.clear();
+    self._openLog();
+    if session is not None:                                                             # If running in an existing session
+      self._runner = Thread( target = self._runSession );                               # Thread to run job in session
+      self._runner.start();
+      if nowait:
+        return None
+      return self.wait()
 
     self._proc  = Popen( self.fullcmd, stdout = PIPE, stderr = PIPE, 
                       cwd                = os.path.expanduser('~'),
-                      env                = my_env,
-                      universal_newlines = True );                                      # Start the IDL process
-    self._stdout = Thread( target=self._logSTD, args=(self._STDOUTLVL, self._proc.stdout,) );   # Initialize thread to log stdout to logger
-    self._stderr = Thread( target=self._logSTD, args=(self._STDERRLVL, self._proc.stderr,) );   # Initialize thread to log stderr to logger
-
-    self._stdout.start();                                                               # Start thread to pipe stdout
-    self._stderr.start();                                                               # Start thread to pipe stderr
+                      env                = _idlEnv( self.log ) );                       # Start the IDL process
+    self._nopen  = 2;                                                                   # stdout and stderr open
+    _READER.register( self._proc.stdout, lambda data: self._logSTD( self._STDOUTLVL, data ), self._pipeClosed );   # Log stdout to logger
+    _READER.register( self._proc.stderr, lambda data: self._logSTD( self._STDERRLVL, data ), self._pipeClosed );   # Log stderr to logger
 
     if nowait:                                                                          # If the nowait keyword is set
         return None                                                                    # Return None
@@ -71,12 +499,180 @@ class IDLJob( object ):
 
   #############################################################################
   def wait(self):
-    self._stdout.join()
-    self._stderr.join()
-    self._proc.communicate()
+    """
+    Block until the job finishes and its output has been logged
+
+    Returns:
+      bool : The failed state of the job
+
+    """
+
+    self._done.wait();
+    _WRITER.flush();
+    return self.failed
+
+  #############################################################################
+  async def run(self):
+    """
+    Coroutine that runs the IDL subprocess and logs its stdout and stderr
+
+    The asyncio equivalent of start(); the process is started with
+    asyncio.create_subprocess_exec and its output read by the event
+    loop, so no threads are used.
+
+    Arguments:
+      None
+
+    Keyword arguments:
+      None
 
+    Returns:
+      bool : The failed state of the job; True if IDL process failed, or
+        could not be started
+
+    Note:
+      If the coroutine is cancelled, the IDL process is killed and the
+      job finished as failed before CancelledError is raised.
+
+    """
+
+    self.failed    = True;                                                              # Set failed to True, will be set to false when sentinel read
+    self._finished = False;
+    self.returncode = None;
+    self.cpuUser    = self.cpuSystem = self.maxRSS = None;
+    self.startTime  = time.time();
+    self._done.clear();
+    try:
+      self._openLog();
+      proc = await asyncio.create_subprocess_exec( *self.fullcmd,
+                        stdout = asyncio.subprocess.PIPE,
+                        stderr = asyncio.subprocess.PIPE,
+                        cwd    = os.path.expanduser('~'),
+                        env    = _idlEnv( self.log ) );                                 # Start the IDL process
+    except Exception as err:                                                            # If could not start, e.g., IDL not found
+      self.log.error( 'Failed to start IDL job: {}'.format(err) );
+      self._finish();
+      return self.failed
+
+    try:
+      await asyncio.gather( self._alogSTD( self._STDOUTLVL, proc.stdout ),
+                            self._alogSTD( self._STDERRLVL, proc.stderr ) );            # Log output until pipes close
+      self.returncode = await proc.wait();
+    except asyncio.CancelledError:                                                      # Do not leave IDL running
+      if proc.returncode is None:
+        proc.kill();
+      self.failed = True;
+      self._finish();
+      raise
+    self._finish();
     return self.failed
 
+  #############################################################################
+  def metrics(self):
+    """
+    Timings and resource usage of the job
+
+    Returns:
+      dict : queueWait (time from submit to start), wallTime, cpuUser,
+        cpuSystem (seconds), maxRSS (bytes), failed, returncode, and
+        cached.
+        Values that were not measured are None; CPU times and peak RSS
+        are not measured for jobs run in a session or with run()
+
+    """
+
+    return {
+      'cmd'       : self.IDLcmd,
+      'queueWait' : None if self.submitTime is None or self.startTime is None else self.startTime - self.submitTime,
+      'wallTime'  : None if self.startTime is None or self.endTime is None else self.endTime - self.startTime,
+      'cpuUser'   : self.cpuUser,
+      'cpuSystem' : self.cpuSystem,
+      'maxRSS'    : self.maxRSS,
+      'failed'    : self.failed,
+      'returncode': self.returncode,
+      'cached'    : self.cached,
+    }
+
+  #############################################################################
+  def add_done_callback(self, fn):
+    """
+    Register a function to call when the job finishes
+
+    The function is called with the job as its only argument, from the
+    thread that detected the end of the job, or right away if the job
+    has already finished. Callbacks are cleared once called.
+
+    Arguments:
+      fn : Function to call
+
+    Returns:
+      None
+
+    """
+
+    with self._cblock:
+      if not self._finished:
+        self._callbacks.append( fn );
+        return
+    fn( self );
+
+  #############################################################################
+  def tail(self, n = None):
+    """
+    Last lines of output of the job
+
+    Keyword arguments:
+      n (int) : Number of lines to return; default is all lines kept
+
+    Returns:
+      list : Lines of stdout and stderr, as str, oldest first
+
+    """
+
+    lines = list( self._tail )[-n:] if n else list( self._tail );
+    return [line.decode( errors = 'replace' ) for line in lines]
+
+  #############################################################################
+  def _finish(self):
+    """Mark the job finished and call the done callbacks"""
+
+    self.endTime = time.time();
+    if self._logfile is not None:
+      self._logfile.close();
+      self._logfile = None;
+    if self._dropped > 0:
+      _WRITER.put( self.log, logging.WARNING, ['{} lines of IDL output not logged; over rate limit'.format( self._dropped )] );
+      self._dropped = 0;
+    if not self.failed and len(self._outputs) > 0:                                      # If job succeeded and has outputs
+      try:
+        self.outputs = {name : self._arrayOut( name ) for name in self._outputs};       # Map output arrays
+      except Exception as err:
+        self.log.error( 'Failed to read IDL outputs: {}'.format(err) );
+        self.failed = True;
+    with self._cblock:
+      self._finished  = True;
+      callbacks       = self._callbacks;
+      self._callbacks = [];
+    self._done.set();
+    for fn in callbacks:
+      fn( self );
+
+  #############################################################################
+  def _openLog(self):
+    """Open the log file, if set, on the thread starting the job"""
+
+    if self._logpath is not None and self._logfile is None:
+      self._logfile = open( self._logpath, 'ab' );
+
+  #############################################################################
+  def _runSession(self):
+    """Run the job in its session, then call the done callbacks"""
+
+    try:
+      self._session.run( self );
+    finally:
+      self._finish();
+
   #############################################################################
   def is_alive(self):
     """
@@ -93,7 +689,7 @@ class IDLJob( object ):
 
     """
 
-    return (self._proc.poll() is None);                                         # If poll() method returns None, then still running
+    return (self.startTime is not None) and (not self._done.is_set());          # Started and not yet finished
 
   #############################################################################
   def _parseArgs(self, cmd, **kwargs):
@@ -131,6 +727,8 @@ class IDLJob( object ):
         elif (type(varVal) is bool):                                                    # If it is a boolean
           varVal       = 1 if (varVal is True) else 0;                                  # Set varVal to one (1) if True, zero (0) if False
           self.IDLcmd += ["{} = {}".format(varName, varVal)];                           # Just set value
+        elif isinstance(varVal, np.ndarray):                                            # If value is an array
+          self.IDLcmd += [self._arrayIn( varName, varVal )];                            # Command reads array from file
         elif (type(varVal) is str):                                                     # If value is string type
           if os.path.isdir(varVal):                                                     # If string is a valid directory
             varVal = os.path.join(varVal, '');                                          # Ensure has trailing separator on it
@@ -139,102 +737,162 @@ class IDLJob( object ):
           self.IDLcmd += ["{} = {}".format(varName, varVal)];                           # Just set value
 
     self.IDLcmd += [cmd];                                                               # Append full command to list
-    self.IDLcmd += ["MESSAGE, '{}', /CONTINUE".format( self._finishedMSG )];            # Append IDL message call with custom text to signal that process completed
+    for name in self._outputs:                                                          # Iterate over output variables
+      hdr, dat     = self._arrayFiles( name );
+      self.IDLcmd += ["OPENW, idlpy_lun, '{}', /GET_LUN & WRITEU, idlpy_lun, LONG64(SIZE({})) & FREE_LUN, idlpy_lun".format(hdr, name),
+                      "OPENW, idlpy_lun, '{}', /GET_LUN & WRITEU, idlpy_lun, {} & FREE_LUN, idlpy_lun".format(dat, name)];   # Write size and data of variable
+    self.IDLcmd += [self._finishedCMD];                                                 # Append IDL message call with custom text to signal that process completed
     self.IDLcmd  = ' & '.join( self.IDLcmd );                                           # Join IDLcmd list on ' & ' and place in double quotes
-    self.fullcmd = ['idl', '-e', self.IDLcmd];                                          # Command to spawn
+    self.fullcmd = [IDL_EXE, '-e', self.IDLcmd];                                          # Command to spawn
 #    self.fullcmd = ['idl', '-arg', 'bowman', '-e', self.IDLcmd];                                          # Command to spawn
     self.log.debug( 'IDL command: {}'.format( ' '.join(self.fullcmd) ) )
  
   #############################################################################
-  def _logSTD( self, level, pipe ):
+  def cleanup(self):
     """
-    Method to read text from a pipe and send it to a logger at a given log level
+    Delete the files used to pass arrays to and from IDL
 
-    Arguments:
-      level  : The level to log at
-      pipe   : Pipe to read from
+    The arrays in the outputs attribute must not be used afterwards. The
+    files are also deleted when the job is garbage collected.
 
-    Keyword arguments:
-      None
+    """
 
-    Returns:
-      None
+    if self._tmpdir is not None:
+      self._tmpdir.cleanup();
+      self._tmpdir = None;
 
+  #############################################################################
+  def _arrayFiles( self, name ):
     """
+    Paths of the header and data files for an array variable
 
-    line = pipe.readline();                                                     # Read a line from the pipe
-    while line != '':                                                           # While the line is not empty
-      self.log.log( level, line.rstrip() );                                     # As the line to the logger; strip off all return characters
-      if (self._finishedMSG in line):                                           # If the _finishedMSG is in the line
-        self.failed = False;                                                    # Set failed to False
-      line = pipe.readline();                                                   # Read another line from the pipe
+    Arguments:
+      name (str) : IDL variable name
 
-##############################################################################
-class IDLAsyncQueue( object ):
-  def __init__(self, concurrency = NCPU):
-    self.concurrency = concurrency
-    self._queue     = [];
-    self._njobs     = 0
-    self._jobs      = [];
-    self._jobpass   = [];
-    self._thread    = None;
+    Returns:
+      tuple : Paths of header and data files
+
+    """
+
+    if self._tmpdir is None:                                                    # Create directory on first use
+      self._tmpdir = tempfile.TemporaryDirectory( prefix = 'idlpy_', dir = self._tmproot );
+    base = os.path.join( self._tmpdir.name, name );
+    return base + '.hdr', base + '.dat'
 
   #############################################################################
-  def submitJob(self, job):
+  def _arrayIn( self, name, arr ):
     """
-    Submit an IDLJob object to the queue to be run at a later time
+    Write an array to a file and build IDL commands to read it
+
+    An np.memmap backed by a whole file in C order is read by IDL from its
+    file directly, without a copy.
 
     Arguments:
-      job (IDLJob)  : An IDLJob instance to be run at later time
+      name (str) : IDL variable name
+      arr (numpy.ndarray) : Array to pass to IDL
 
-    Keyword arguments:
-      None.
+    Returns:
+      str : IDL commands that read the array into name
+
+    """
+
+    if arr.dtype == np.bool_:                                                   # IDL has no boolean type
+      arr = arr.astype( np.uint8 );
+    if not arr.dtype.isnative:                                                  # IDL reads native byte order
+      arr = arr.astype( arr.dtype.newbyteorder('=') );
+    if arr.dtype not in IDL_TYPES:
+      raise Exception( 'Cannot pass array of type {} to IDL'.format(arr.dtype) )
+
+    if isinstance(arr, np.memmap) and arr.filename and arr.offset == 0 and \
+       arr.flags['C_CONTIGUOUS'] and os.path.getsize(arr.filename) == arr.nbytes:   # If array is a whole file already
+      arr.flush();
+      path = arr.filename;
+    else:
+      path = self._arrayFiles( name )[1];
+      out  = np.memmap( path, dtype = arr.dtype, mode = 'w+', shape = arr.shape );  # Write through memory map
+      out[...] = arr;
+      out.flush();
+      del out
+
+    dims = ', '.join( str(n) for n in arr.shape[::-1] ) if arr.ndim > 0 else '1';     # IDL dimensions are in reverse order
+    return ("OPENR, idlpy_lun, '{}', /GET_LUN & {} = MAKE_ARRAY({}, TYPE={}, /NOZERO) & "
+            "READU, idlpy_lun, {} & FREE_LUN, idlpy_lun").format(path, name, dims, IDL_TYPES[arr.dtype], name)
+
+  #############################################################################
+  def _arrayOut( self, name ):
+    """
+    Map an array written by IDL
+
+    Arguments:
+      name (str) : IDL variable name
 
     Returns:
-      None
+      np.memmap : The array, in the dimension order of numpy
 
     """
 
-    if isinstance( job, IDLJob ):
-      self._njobs += 1;
-      self._queue.append( job );
+    hdr, dat = self._arrayFiles( name );
+    size     = np.fromfile( hdr, dtype = np.int64 );                            # IDL SIZE(): ndim, dims, type, number of elements
+    ndim     = int(size[0]);
+    dtype    = NP_TYPES.get( int(size[ndim+1]) );
+    if dtype is None:
+      raise Exception( 'Cannot return IDL variable {} of type code {}'.format(name, size[ndim+1]) )
+    shape    = tuple( int(n) for n in size[1:ndim+1][::-1] ) or (1,);           # numpy dimensions are in reverse order
+    return np.memmap( dat, dtype = dtype, mode = 'r+', shape = shape )
 
   #############################################################################
-  def startJobs(self, nowait = False):
+  def _logSTD( self, level, data ):
     """
-    Start processing/running jobs in the queue
+    Method to send a block of output to a logger at a given log level
+
+    The lines are kept in the tail of the job and written to the log
+    file, if set, or else handed to the log writer thread, up to the
+    rate limit, if set. Nothing is split or decoded if the lines would
+    not be logged.
 
     Arguments:
-      None
+      level  : The level to log at
+      data   : bytes of one or more whole lines of output
 
     Keyword arguments:
-      nowait (bool) : If set, method will start thread to manage jobs and return
-        immediately. Should only be used in special cause, but
-        is intended to allow user to keep submitting jobs to queue. 
+      None
 
     Returns:
-      Typically returns a tuple where first element is number of jobs
-      that completed successfully and seoncd element is total number of
-      jobs run. However, if the nowait keyword is set, will return None.
-
-    Note:
-      It is possible that the job queue could empty before one submits a
-      new job, which means the new job wont start until this method is called
-      again
+      None
 
     """
 
-    self._thread = Thread(target = self._run);                                  # Initialize thread to run the _run method
-    self._thread.start();                                                       # Start the thread
-    if nowait:                                                                  # If nowait is set
-      return None, None;                                                        # Return None tuple
-    else:                                                                       # Else
-      return self.join();                                                       # Call join method
+    if (self._finishedB in data):                                               # If the _finishedMSG is in the output
+      self.failed = False;                                                      # Set failed to False
+    if self._logfile is not None:                                               # Output goes to file; opened by _openLog
+      self._logfile.write( data );
+    tolog = (self._logpath is None) and self.log.isEnabledFor( level );
+    if not (tolog or self._tail.maxlen):
+      return
+    lines = data.splitlines();
+    if self._tail.maxlen:
+      self._tail.extend( lines );
+    if not tolog:
+      return
+
+    if self._rate is not None:                                                  # Token bucket; bursts of up to one second of lines
+      now = time.time();
+      if self._tokens is None:
+        self._tokens = float( self._rate );
+      else:
+        self._tokens = min( float( self._rate ), self._tokens + (now - self._tokenTime) * self._rate );
+      self._tokenTime = now;
+      nlog          = min( len(lines), int( self._tokens ) );
+      self._tokens -= nlog;
+      self._dropped += len(lines) - nlog;
+      lines         = lines[:nlog];
+    if len(lines) > 0:
+      _WRITER.put( self.log, level, lines );
 
   #############################################################################
-  def join(self):
+  def _pipeClosed( self ):
     """
-    Wait for all jobs in the queue to finish
+    Method called when an output pipe closes; finishes job once both closed
 
     Arguments:
       None
@@ -243,27 +901,65 @@ class IDLAsyncQueue( object ):
       None
 
     Returns:
-      tuple: first element is number of jobs that ran
-        successfully and second element is total number of jobs run.
-        In a perfect world, these two numbers would always equal eachother.
+      None
 
-    Note:
-      If the startJobs method was never called, then this method will return (None, None,)
+    """
 
+    with self._cblock:
+      self._nopen -= 1;
+      last = self._nopen == 0;                                                  # Whether this is the last pipe to close
+    if not last:
+      return
+    if not self._reap( block = False ):                                         # If process has not exited yet, wait without blocking the reader
+      Thread( target = self._reap ).start();
+
+  #############################################################################
+  def _reap( self, block = True ):
     """
+    Wait for the IDL process to exit, record its exit status and resource
+    usage, and finish the job
+
+    Keyword arguments:
+      block (bool) : If not set, return right away if process is running
+
+    Returns:
+      bool : True if the process exited and the job was finished
+
+    """
+
+    if not hasattr(os, 'wait4'):                                                # No resource usage on this platform
+      if (not block) and (self._proc.poll() is None):
+        return False
+      self.returncode = self._proc.wait();
+      self._finish();
+      return True
+
+    try:
+      pid, status, usage = os.wait4( self._proc.pid, 0 if block else os.WNOHANG );
+    except ChildProcessError:                                                   # Already reaped by Popen
+      self.returncode = self._proc.wait();
+      self._finish();
+      return True
+    if pid == 0:                                                                # Still running
+      return False
+    self._proc.returncode = os.waitstatus_to_exitcode( status );               # Tell Popen the process was reaped
+    self.returncode       = self._proc.returncode;
+    self.cpuUser          = usage.ru_utime;
+    self.cpuSystem        = usage.ru_stime;
+    self.maxRSS           = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024);   # ru_maxrss is kilobytes on Linux, bytes on macOS
+    self._finish();
+    return True
 
-    if (self._thread is not None):                                              # If the _thread attribute is not None
-      self._thread.join();                                                      # Join the thread, i.e., wait for it to finish
-      nsuccess, ntot = sum( self._jobpass ), self._njobs;                       # Number of successful (i.e., NOT failed) and # total jobs
-      self.__reset();                                                           # Reset all values
-      return nsuccess, ntot;                                                    # Return # successful and # total jobs
-    return None, None
   #############################################################################
-  def _run(self):
+  async def _alogSTD( self, level, stream ):
     """
-    Actually run/manage all the process in the queue
+    Read blocks of whole lines from an asyncio stream and pass them to _logSTD
 
     Arguments:
+      level  : The level to log at
+      stream : asyncio.StreamReader to read from
+
+    Keyword arguments:
       None
 
     Returns:
@@ -271,51 +967,1424 @@ class IDLAsyncQueue( object ):
 
     """
 
-    while len(self._queue) > 0:                                                     # While there are jobs in the queue
-      self._manage();                                                               # Block until process finishes if too many running 
-      job = self._queue.pop(0);                                                     # Pop job object off of queue
-      job.start( nowait = True );                                                   # Start and do NOT wait to finish (non-blocking)
-      self._jobs.append( job );                                                     # Append job to jobs arrray 
-    self._manage( waitall = True );                                                 # Wait for rest of jobs to finish
+    data = b'';
+    while True:                                                                 # Read until the stream closes
+      block = await stream.read( 65536 );
+      if not block:
+        break
+      data += block;
+      end   = data.rfind( b'\n' ) + 1;                                          # End of last whole line
+      if end > 0:
+        self._logSTD( level, data[:end] );
+        data = data[end:];
+    if data:
+      self._logSTD( level, data );
+
+###############################################################################
+class IDLSession( object ):
+  """
+  A long-lived IDL process that runs IDLJobs sent to it over stdin
+
+  Starting IDL, checking out a licence, and running the IDL_STARTUP file
+  is paid once when the session is created instead of once per job.
+  Each job's command is sent as one line, followed by RETALL (to return
+  to the main level if the job stopped with an error) and a line that
+  prints a marker once IDL is ready for the next job. As with a spawned
+  job, the job succeeded if the _finishedMSG sentinel was printed before
+  the marker. Variables set by a job remain defined in the session.
+
+  Example:
+    with IDLSession() as session:
+      for job in jobs:
+        job.start( session = session )
+
+  """
+
+  _readyMSG = 'spawnIDL SESSION READY';                                                 # Message printed when session is ready for a command
+  _readyCMD = "RETALL\nPRINT, 'spawnIDL SESSION ' + 'READY' & FLUSH, -1\n";           # Marker built by concatenation so an echoed command does not match it
+
+  def __init__(self, _STDOUTLVL=logging.INFO):
+    self.log        = logging.getLogger(__name__);
+    self._STDOUTLVL = _STDOUTLVL
+    self._lock      = Lock();                                                           # Only one job runs in a session at a time
+    self._proc      = Popen( [IDL_EXE], stdin = PIPE, stdout = PIPE, stderr = STDOUT,
+                      cwd                = os.path.expanduser('~'),
+                      env                = _idlEnv( self.log ),
+                      universal_newlines = True,
+                      bufsize            = 1 );                                         # Start IDL reading commands from stdin; stderr merged so output stays in order
+    if not self._sync( '', self.log, self._STDOUTLVL ):                                 # Wait for startup to finish
+      self.close();
+      raise Exception( 'IDL session exited during startup' )
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
 
   #############################################################################
-  def _manage(self, waitall = False, update = 0.1):
+  def run(self, job):
     """
-    Manage the concurrent processes
-
-    A method intended to block until a process opens up. This means
-    if concurrency is set to 4 and 4 processes are running, we continually
-    check until a process finishes. When one finishes, the method returns
+    Run an IDLJob in the session, blocking until it finishes
 
     Arguments:
-      None
+      job (IDLJob) : Job to run
 
     Keyword arguments:
-      waitall (bool)  : If set, block until all running jobs finish
-      update  (float) : Sleep interval (in seconds) between checks for jobs
-        finished
+      None.
 
     Returns:
-      None
+      bool : The failed state of the job
 
-   """
+    """
 
-    njobs = 1 if waitall else self.concurrency;                                     # Set njobs to one (1) if waitall is set, else use concurrency
-    while len(self._jobs) > (njobs-1):                                              # While number of jobs is greater than one less the allowed number of jobs
-      for i in range( len(self._jobs) ):                                            # Iterate over all job objects
-        if not self._jobs[i].is_alive():                                            # If the job is NOT alive
-          job = self._jobs.pop(i);                                                  # Pop off the job
-          self._jobpass.append( not job.wait() );                                   # Get the opposite of failure state of job and append _jobpass list
-          break;                                                                    # Break the for loop
-      time.sleep( update );                                                         # Sleep for 100 miliseconds
+    with self._lock:
+      job.failed = not self._sync( job.IDLcmd + '\n', job.log, job._STDOUTLVL, job._finishedMSG,
+                                   onData = lambda data: job._logSTD( job._STDOUTLVL, data ) );
+    return job.failed
 
   #############################################################################
-  def __reset(self):
-    """ Method to 're-initialize' the class"""
-    self._queue   = [];
-    self._njobs   = 0
-    self._jobs    = [];
-    self._jobpass = [];
-    self._thread  = None;
+  def is_alive(self):
+    """
+    Check if the IDL process is still running
+
+    Returns:
+      bool: True if running, false if exited
+
+    """
+
+    return (self._proc.poll() is None);
+
+  #############################################################################
+  def close(self):
+    """Exit the IDL session and wait for the process to finish"""
+
+    if self.is_alive():
+      try:
+        self._proc.stdin.write( 'EXIT\n' );
+        self._proc.stdin.flush();
+      except (BrokenPipeError, OSError):                                                # IDL exited in the meantime
+        pass
+    self._proc.communicate();
+
+  #############################################################################
+  def _sync(self, cmd, log, level, sentinel = None, onData = None):
+    """
+    Send a command followed by the ready marker and log output until the marker
+
+    Arguments:
+      cmd (str) : Command(s) to send; may be empty
+      log : Logger to send output to
+      level : Level to log output at
+
+    Keyword arguments:
+      sentinel (str) : If set, text to look for in the output
+      onData : If set, function called with each line of output, as
+        bytes, instead of logging it
+
+    Returns:
+      bool : True if the sentinel was found (or not set) and the session
+        is still alive, False otherwise
+
+    """
+
+    found = sentinel is None
+    try:
+      self._proc.stdin.write( cmd + self._readyCMD );
+      self._proc.stdin.flush();
+    except (BrokenPipeError, OSError):                                                  # IDL has exited
+      return False
+
+    line = self._proc.stdout.readline();
+    while line != '':                                                                   # While IDL has not exited
+      if (self._readyMSG in line):                                                      # If ready for next command
+        return found
+      if onData is None:
+        log.log( level, line.rstrip() );
+      else:
+        onData( line.encode() );
+      if (sentinel is not None) and (sentinel in line):
+        found = True
+      line = self._proc.stdout.readline();
+    self.log.warning( 'IDL session exited' );                                           # Reached end of output; e.g., job called EXIT
+    return False
+
+###############################################################################
+class IDLSessionPool( object ):
+  """
+  A pool of IDLSessions
+
+  Sessions are started as they are first needed, up to size, and are
+  reused by later jobs. Sessions whose IDL process has exited are
+  discarded when released and replaced the next time one is needed.
+
+  """
+
+  def __init__(self, size = NCPU, **kwargs):
+    self.size    = size
+    self._kwargs = kwargs;                                                              # Keywords for IDLSession
+    self._idle   = Queue();                                                             # Sessions ready for a job
+    self._lock   = Lock();
+    self._nopen  = 0;                                                                   # Number of sessions started and not discarded
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  #############################################################################
+  def acquire(self):
+    """
+    Get a session, blocking if all size sessions are in use
+
+    Returns:
+      IDLSession : Session to run a job in; pass back to release() when done
+
+    """
+
+    while True:
+      try:
+        session = self._idle.get_nowait();
+      except Empty:
+        with self._lock:
+          start        = self._nopen < self.size;                                       # Whether to start a new session
+          self._nopen += int(start);
+        if start:
+          try:
+            return IDLSession( **self._kwargs );
+          except:
+            with self._lock:
+              self._nopen -= 1;
+            raise
+        session = self._idle.get();                                                     # Wait for a session to be released
+      if session is not None:                                                           # None means a session was discarded; try again
+        return session
+
+  #############################################################################
+  def release(self, session):
+    """
+    Return a session to the pool
+
+    Arguments:
+      session (IDLSession) : Session obtained from acquire()
+
+    """
+
+    if session.is_alive():
+      self._idle.put( session );
+    else:
+      with self._lock:
+        self._nopen -= 1;
+      self._idle.put( None );                                                           # Wake any waiting acquire() to start a new session
+
+  #############################################################################
+  def close(self):
+    """Close all idle sessions"""
+
+    while True:
+      try:
+        session = self._idle.get_nowait();
+      except Empty:
+        break
+      if session is not None:
+        session.close();
+        with self._lock:
+          self._nopen -= 1;
+
+##############################################################################
+class IDLCache( object ):
+  """
+  On-disk cache of the results of IDLJobs
+
+  Results are keyed on a hash of the IDL command and variables of the
+  job, with the contents of array variables and the modification time
+  and size of input files in place of their paths. Input files are string variables
+  that name an existing file or directory, and the paths given by the
+  _INPUTS keyword of the job. Each entry holds the files the job declared
+  with _OUTFILES and the arrays named by _OUTPUTS; a hit copies them back
+  into place, so the job finishes without running IDL. Relative paths
+  are relative to the home directory, where IDL runs. The key of a job
+  is computed when it is first looked up, and used again to store it.
+
+  Entries not used for maxAge seconds are evicted, then the least
+  recently used until the cache is no larger than maxSize. Entries are
+  written to a temporary directory and renamed into place, so one cache
+  directory can be shared by several processes.
+
+  Example:
+    cache = IDLCache( '~/.cache/idlpy', maxSize = 10 * 2**30 )
+    queue = IDLAsyncQueue( cache = cache )
+
+  """
+
+  def __init__(self, directory, maxSize = None, maxAge = None, link = False):
+    """
+    Arguments:
+      directory (str) : Directory to store the cache in; created if it
+        does not exist
+
+    Keyword arguments:
+      maxSize (int) : Maximum size of the cache, in bytes. Default is no limit
+      maxAge (float) : Maximum time, in seconds, since an entry was last
+        used. Default is no limit
+      link (bool) : If set, hard link output files into and out of the
+        cache instead of copying them, where the file system allows. The
+        linked files must then not be modified in place
+
+    """
+
+    self.directory = os.path.abspath( os.path.expanduser( directory ) );
+    self.maxSize   = maxSize
+    self.maxAge    = maxAge
+    self.link      = link
+    self.log       = logging.getLogger(__name__);
+    os.makedirs( self.directory, exist_ok = True );
+
+  #############################################################################
+  def key(self, job):
+    """
+    Compute the cache key of a job
+
+    Arguments:
+      job (IDLJob) : Job to compute key of
+
+    Returns:
+      str : Hex digest of the key
+
+    """
+
+    if job._cacheKey is None:
+      job._cacheKey = self._key( job );
+    return job._cacheKey
+
+  #############################################################################
+  def _key(self, job):
+    """Compute the cache key of a job; see key()"""
+
+    cmd = job.IDLcmd;
+    if job._tmpdir is not None:                                                 # Paths of array files change every run
+      cmd = cmd.replace( job._tmpdir.name, '' );
+    key = hashlib.sha256( cmd.encode() );
+    for name in sorted( job._kwargs ):
+      val = job._kwargs[name];
+      if isinstance(val, np.ndarray):                                           # Key on array contents
+        key.update( '{}:{}:{}'.format(name, val.dtype.str, val.shape).encode() );
+        key.update( np.ascontiguousarray( val ).data );
+      elif isinstance(val, str) and os.path.exists( self._resolve( val ) ):     # Key on state of input file
+        key.update( '{}:{}'.format(name, self._fileState( val )).encode() );
+      else:
+        key.update( '{}:{!r}'.format(name, val).encode() );
+    for path in job._inputs:
+      key.update( 'input:{}'.format(self._fileState( path )).encode() );
+    key.update( repr( (job._outfiles, job._outputs) ).encode() );
+    return key.hexdigest()
+
+  #############################################################################
+  def contains(self, job):
+    """
+    Check if the cache has an entry for a job
+
+    Arguments:
+      job (IDLJob) : Job to look up
+
+    Returns:
+      bool : True if there is an entry
+
+    """
+
+    return os.path.isfile( os.path.join( self.directory, self.key( job ), 'meta.json' ) )
+
+  #############################################################################
+  def fetch(self, job):
+    """
+    Finish a job from the cache, if it has an entry
+
+    Output files and arrays of the job are restored and the job is
+    finished as successful, with its cached attribute set, calling its
+    done callbacks.
+
+    Arguments:
+      job (IDLJob) : Job to look up
+
+    Returns:
+      bool : True if the job was finished from the cache
+
+    """
+
+    entry = os.path.join( self.directory, self.key( job ) );
+    try:
+      with open( os.path.join( entry, 'meta.json' ) ) as fid:
+        meta = json.load( fid );
+      for i, path in enumerate( meta['outfiles'] ):
+        self._put( os.path.join( entry, 'files', str(i) ), self._resolve( path ) );
+      for name in meta['outputs']:
+        for src, dst in zip( self._arrayFiles( entry, name ), job._arrayFiles( name ) ):
+          shutil.copyfile( src, dst );                                          # Copied as job may modify memmap
+      os.utime( os.path.join( entry, 'meta.json' ) );                           # Mark entry as used
+    except (OSError, ValueError, KeyError):                                     # No entry, or evicted while reading
+      return False
+
+    self.log.debug( 'IDL job found in cache: {}'.format( entry ) );
+    job.failed    = False;
+    job.cached    = True;
+    job.startTime = time.time();
+    job._finish();
+    return True
+
+  #############################################################################
+  def store(self, job):
+    """
+    Add the result of a successful job to the cache
+
+    Arguments:
+      job (IDLJob) : Finished job
+
+    Returns:
+      None
+
+    """
+
+    if job.failed or job.cached:
+      return
+    entry = os.path.join( self.directory, self.key( job ) );
+    if os.path.isdir( entry ):
+      return
+    tmp = tempfile.mkdtemp( prefix = '.tmp', dir = self.directory );
+    try:
+      os.mkdir( os.path.join( tmp, 'files' ) );
+      os.mkdir( os.path.join( tmp, 'arrays' ) );
+      for i, path in enumerate( job._outfiles ):
+        self._put( self._resolve( path ), os.path.join( tmp, 'files', str(i) ) );
+      for name in job._outputs:
+        for src, dst in zip( job._arrayFiles( name ), self._arrayFiles( tmp, name ) ):
+          shutil.copyfile( src, dst );
+      with open( os.path.join( tmp, 'meta.json' ), 'w' ) as fid:
+        json.dump( {'cmd' : job.IDLcmd, 'outfiles' : job._outfiles, 'outputs' : job._outputs}, fid );
+      os.rename( tmp, entry );                                                  # Fails if another process stored it first
+    except OSError as err:
+      self.log.debug( 'IDL job not cached: {}'.format( err ) );
+      shutil.rmtree( tmp, ignore_errors = True );
+      return
+    self.evict();
+
+  #############################################################################
+  def evict(self):
+    """
+    Remove expired entries, then least recently used entries over maxSize
+
+    Returns:
+      None
+
+    """
+
+    if self.maxAge is None and self.maxSize is None:
+      return
+    entries = [];
+    for name in os.listdir( self.directory ):
+      entry = os.path.join( self.directory, name );
+      try:
+        used = os.path.getmtime( os.path.join( entry, 'meta.json' ) );
+      except OSError:                                                           # Temporary directory being written
+        continue
+      size = sum( os.path.getsize( os.path.join( root, f ) )
+                    for root, dirs, files in os.walk( entry ) for f in files );
+      entries.append( (used, size, entry,) );
+
+    entries.sort();                                                             # Least recently used first
+    total = sum( e[1] for e in entries );
+    now   = time.time();
+    for used, size, entry in entries:
+      expired = self.maxAge is not None and now - used > self.maxAge;
+      if not expired and (self.maxSize is None or total <= self.maxSize):
+        break
+      shutil.rmtree( entry, ignore_errors = True );
+      total -= size;
+
+  #############################################################################
+  def clear(self):
+    """Remove all entries from the cache"""
+
+    for name in os.listdir( self.directory ):
+      shutil.rmtree( os.path.join( self.directory, name ), ignore_errors = True );
+
+  #############################################################################
+  def _put(self, src, dst):
+    """Copy, or hard link if link is set, file src to dst"""
+
+    if os.path.dirname( dst ):
+      os.makedirs( os.path.dirname( dst ), exist_ok = True );
+    if self.link:
+      try:
+        if os.path.lexists( dst ):
+          os.remove( dst );
+        os.link( src, dst );
+        return
+      except OSError:                                                           # E.g., different file systems
+        pass
+    shutil.copyfile( src, dst );
+
+  #############################################################################
+  @staticmethod
+  def _resolve( path ):
+    """Absolute path of a path given to IDL, which runs in the home directory"""
+
+    return os.path.abspath( os.path.join( os.path.expanduser('~'), path ) )
+
+  #############################################################################
+  @classmethod
+  def _fileState( cls, path ):
+    """Absolute path, modification time, and size of a file"""
+
+    path = cls._resolve( path );
+    try:
+      st = os.stat( path );
+    except OSError:
+      return (path, None, None,)
+    return (path, st.st_mtime_ns, st.st_size,)
+
+  #############################################################################
+  @staticmethod
+  def _arrayFiles( entry, name ):
+    """Paths of the header and data files of an array in a cache entry"""
+
+    base = os.path.join( entry, 'arrays', name );
+    return base + '.hdr', base + '.dat'
+
+##############################################################################
+class IDLAsyncQueue( object ):
+  def __init__(self, concurrency = NCPU, sessions = False, memory = None, cache = None,
+                     batch = None, batchTime = 2.0, adaptive = False, minConcurrency = 1,
+                     adaptInterval = 5.0, maxMetrics = 10000):
+    """
+    Keyword arguments:
+      concurrency (int) : Number of CPU slots; by default each job uses
+        one, so this is the maximum number of jobs to run at once. If
+        adaptive is set, the maximum number of slots
+      sessions (bool) : If set, run jobs in a pool of concurrency
+        long-lived IDLSessions, instead of spawning IDL for every job.
+        The sessions are kept between calls to startJobs(); call close()
+        when done with the queue
+      memory (int) : Memory budget, in bytes, for the estimated memory of
+        running jobs. Default is no limit
+      cache (IDLCache) : If set, jobs with an entry in the cache finish
+        from it without running IDL, and the results of successful jobs
+        are added to it
+      batch (int or str) : If set, up to this many pending jobs that use
+        the same resources are run one after another in one IDL process,
+        in one slot, so IDL starts once per batch. Use 'auto' to size
+        batches to run about batchTime seconds from the observed wall
+        time of jobs. Batches are made no larger than needed to spread
+        the pending jobs over all slots
+      batchTime (float) : Target run time, in seconds, of a batch when
+        batch is 'auto'
+      adaptive (bool) : If set, the number of slots is adjusted, between
+        minConcurrency and concurrency, to the CPUs and memory left free
+        by other processes; see _adapt()
+      minConcurrency (int) : Minimum number of slots if adaptive is set
+      adaptInterval (float) : Minimum time, in seconds, between
+        adjustments of the number of slots if adaptive is set
+      maxMetrics (int) : Number of the most recent finished jobs to keep
+        metrics of, for percentiles in stats() and for exportMetrics();
+        totals in stats() cover all jobs
+
+    """
+
+    self.concurrency    = concurrency
+    self.maxConcurrency = concurrency
+    self.minConcurrency = min( minConcurrency, concurrency )
+    self.adaptive       = adaptive
+    self.adaptInterval  = adaptInterval
+    self._adapted       = None;                                                 # time.time() of last adjustment of concurrency
+    self._ownLoad       = 0.0;                                                  # Running jobs averaged like the 1-minute load average
+    self.memory     = memory
+    self.cache      = cache
+    self.batch      = batch
+    self.batchTime  = batchTime
+    self._meanWall  = None;                                                     # Moving average of job wall time, for batch = 'auto'
+    self._pool      = IDLSessionPool( concurrency ) if sessions else None;
+    self._queue     = [];                                                       # Heap of (-priority, sequence, job) for pending jobs
+    self._seq       = 0;                                                        # Submission counter; keeps equal priorities in order
+    self._used      = [0, 0];                                                   # CPU slots and memory used by running jobs
+    self._metrics   = deque( maxlen = maxMetrics );                             # Metrics of the most recent finished jobs; see stats()
+    self._totals    = None;                                                     # Running totals over all finished jobs
+    self.clearMetrics();
+    self._njobs     = 0
+    self._jobs      = [];
+    self._npass     = 0;                                                        # Number of jobs that succeeded
+    self._thread    = None;
+    self._done      = Queue();                                                  # Jobs that have finished, put by job callbacks
+
+  #############################################################################
+  def submitJob(self, job, priority = 0, cpus = 1, memory = 0):
+    """
+    Submit an IDLJob object to the queue to be run at a later time
+
+    Arguments:
+      job (IDLJob)  : An IDLJob instance to be run at later time
+
+    Keyword arguments:
+      priority (int) : Jobs with higher priority start first; jobs of
+        equal priority start in the order submitted
+      cpus (int) : Number of CPU slots the job uses
+      memory (int) : Estimated memory use of the job, in bytes
+
+    Returns:
+      None
+
+    Note:
+      When the highest priority job does not fit in the free CPU slots
+      and memory, lower priority jobs are started in its place only if
+      they fit beside the resources it needs, so it starts as soon as
+      running jobs free them. A job larger than the whole budget runs on
+      its own.
+
+    """
+
+    if isinstance( job, IDLJob ):
+      heapq.heappush( self._queue, self._entry( job, priority, cpus, memory ) );
+
+  #############################################################################
+  def _entry(self, job, priority, cpus, memory):
+    """
+    Build the pending queue entry of a submitted job
+
+    Arguments:
+      job (IDLJob)  : Job submitted
+      priority (int) : Priority of the job
+      cpus (int) : Number of CPU slots the job uses
+      memory (int) : Estimated memory use of the job, in bytes
+
+    Returns:
+      tuple : (-priority, sequence, job) for the heap of pending jobs
+
+    """
+
+    if cpus < 1:                                                                # A job using no slot would never be limited
+      raise Exception( 'Job must use at least one CPU slot' )
+    self._njobs     += 1;
+    job._resources   = (cpus, memory,);
+    job.submitTime   = time.time();
+    self._seq       += 1;
+    return (-priority, self._seq - 1, job,)
+
+  #############################################################################
+  def startJobs(self, nowait = False):
+    """
+    Start processing/running jobs in the queue
+
+    Arguments:
+      None
+
+    Keyword arguments:
+      nowait (bool) : If set, method will start thread to manage jobs and return
+        immediately. Should only be used in special cause, but
+        is intended to allow user to keep submitting jobs to queue. 
+
+    Returns:
+      Typically returns a tuple where first element is number of jobs
+      that completed successfully and seoncd element is total number of
+      jobs run. However, if the nowait keyword is set, will return None.
+
+    Note:
+      It is possible that the job queue could empty before one submits a
+      new job, which means the new job wont start until this method is called
+      again
+
+    """
+
+    self._thread = Thread(target = self._run);                                  # Initialize thread to run the _run method
+    self._thread.start();                                                       # Start the thread
+    if nowait:                                                                  # If nowait is set
+      return None, None;                                                        # Return None tuple
+    else:                                                                       # Else
+      return self.join();                                                       # Call join method
+
+  #############################################################################
+  def join(self):
+    """
+    Wait for all jobs in the queue to finish
+
+    Arguments:
+      None
+
+    Keyword arguments:
+      None
+
+    Returns:
+      tuple: first element is number of jobs that ran
+        successfully and second element is total number of jobs run.
+        In a perfect world, these two numbers would always equal eachother.
+
+    Note:
+      If the startJobs method was never called, then this method will return (None, None,)
+
+    """
+
+    if (self._thread is not None):                                              # If the _thread attribute is not None
+      self._thread.join();                                                      # Join the thread, i.e., wait for it to finish
+      _WRITER.flush();                                                          # Output of all jobs logged before returning
+      nsuccess, ntot = self._npass, self._njobs;                                # Number of successful (i.e., NOT failed) and # total jobs
+      self.__reset();                                                           # Reset all values
+      return nsuccess, ntot;                                                    # Return # successful and # total jobs
+    return None, None
+  #############################################################################
+  def _run(self):
+    """
+    Actually run/manage all the process in the queue
+
+    Jobs are started until concurrency jobs are running, then the thread
+    blocks until a job signals that it finished. All jobs that finished
+    by then are retired at once and the freed slots refilled right away.
+
+    Arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    while len(self._queue) > 0 or len(self._jobs) > 0:                             # While jobs waiting or running
+      self._dispatch();                                                             # Start jobs that fit in free resources
+      self._retire( self._done.get() );                                             # Block until a job finishes
+      while True:                                                                   # Retire any other jobs that finished
+        try:
+          self._retire( self._done.get_nowait() );
+        except Empty:
+          break
+
+  #############################################################################
+  def _dispatch(self):
+    """
+    Start pending jobs, highest priority first, while they fit the budget
+
+    If the highest priority job does not fit, its resources are reserved
+    and pending jobs that fit in what is left are started, in priority
+    order, to fill the free resources; so the highest priority job is not
+    held back by jobs started after it. When batching, jobs following the
+    highest priority job are started with it as a batch; jobs started to
+    fill free resources are not batched.
+
+    Arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    if self.adaptive:
+      self._adapt();
+    while len(self._queue) > 0:
+      if not self._fits( self._queue[0][2] ) and self._cached( self._queue[0][2] ): # Finishes from cache without a slot
+        self._startJob( heapq.heappop( self._queue )[2] );
+        continue
+      if self._fits( self._queue[0][2] ):                                           # If highest priority job fits
+        size = self._batchSize();
+        jobs = [heapq.heappop( self._queue )[2]];
+        while len(jobs) < size and len(self._queue) > 0 and \
+              self._queue[0][2]._resources == jobs[0]._resources:                   # Add following jobs that use same resources
+          jobs.append( heapq.heappop( self._queue )[2] );
+        if len(jobs) == 1:
+          self._startJob( jobs[0] );
+        else:
+          self._startBatch( jobs );
+        continue
+      reserve = self._queue[0][2]._resources;                                       # Keep resources free for highest priority job
+      skipped = [heapq.heappop( self._queue )];
+      while len(self._queue) > 0 and self._used[0] + reserve[0] < self.concurrency: # Backfill, in priority order, while slots are left
+        entry = heapq.heappop( self._queue );
+        if self._fits( entry[2], reserve ) or self._cached( entry[2] ):
+          self._startJob( entry[2] );
+        else:
+          skipped.append( entry );
+      for entry in skipped:
+        heapq.heappush( self._queue, entry );
+      break
+
+  #############################################################################
+  def _adapt(self):
+    """
+    Adjust the number of slots to the CPUs and memory left by other processes
+
+    The CPUs available are those allowed by the affinity mask and cgroup
+    CPU quota of the process, less the load average not due to jobs of
+    the queue. As the load average lags, the jobs of the queue are
+    averaged the same way before subtracting. If the peak RSS of recent
+    jobs is known, slots are also limited so that new jobs fit in 90% of
+    the available memory, or cgroup memory limit. The number of slots is
+    lowered at once but at most doubled per adjustment, and adjusted at
+    most every adaptInterval seconds, so it does not swing with short
+    bursts of load. Jobs already running are not stopped.
 
+    Arguments:
+      None
+
+    Returns:
+      None
+
+    """
+
+    now = time.time();
+    if self._adapted is not None and now - self._adapted < self.adaptInterval:
+      return
+    running = self._used[0];
+    if self._adapted is not None:
+      decay         = np.exp( -(now - self._adapted) / 60.0 );                      # Kernel averages load over 1 minute
+      self._ownLoad = self._ownLoad * decay + running * (1.0 - decay);
+    try:
+      other = max( 0.0, os.getloadavg()[0] - self._ownLoad );                       # Load due to other processes
+    except (AttributeError, OSError):                                               # Load average not available
+      other = 0.0;
+    target = _cpuLimit() - other;
+
+    avail = _availableMemory();
+    rss   = [m['maxRSS'] for m in itertools.islice( reversed( self._metrics ), 20 ) if m['maxRSS']];   # Peak memory of recent jobs
+    if avail is not None and len(rss) > 0:
+      target = min( target, running + 0.9 * avail / max( rss ) );
+
+    target = int( max( self.minConcurrency, min( self.maxConcurrency, target ) ) );
+    if self._adapted is not None:
+      target = min( target, 2 * self.concurrency );                                 # Ramp up gradually
+    if target != self.concurrency:
+      logging.getLogger(__name__).debug( 'IDL job concurrency {} -> {}'.format( self.concurrency, target ) );
+    self.concurrency = target;
+    self._adapted    = now;
+
+  #############################################################################
+  def _fits(self, job, reserve = (0, 0,)):
+    """
+    Check if a job fits in the free CPU slots and memory
+
+    Arguments:
+      job (IDLJob) : Pending job
+
+    Keyword arguments:
+      reserve (tuple) : CPU slots and memory to keep free
+
+    Returns:
+      bool : True if job fits, or if no jobs are running
+
+    """
+
+    if len(self._jobs) == 0:                                                        # Always run something, even if larger than budget
+      return True
+    cpus, memory = job._resources;
+    if self._used[0] + reserve[0] + cpus > self.concurrency:
+      return False
+    return (self.memory is None) or (self._used[1] + reserve[1] + memory <= self.memory)
+
+  #############################################################################
+  def _cached(self, job):
+    """
+    Check if a pending job can finish from the cache
+
+    Arguments:
+      job (IDLJob) : Pending job
+
+    Returns:
+      bool : True if the cache has an entry for the job
+
+    """
+
+    return self.cache is not None and self.cache.contains( job )
+
+  #############################################################################
+  def _startJob(self, job):
+    """
+    Start a job, reserving its resources
+
+    A job found in the cache finishes right away, without reserving
+    resources.
+
+    Arguments:
+      job (IDLJob) : Job to start
+
+    Returns:
+      None
+
+    """
+
+    job._held = (0, 0,);
+    self._jobs.append( job );                                                       # Append job to jobs arrray 
+    job.add_done_callback( self._done.put );                                        # Put job in done queue when it finishes
+    if self.cache is not None and self.cache.fetch( job ):                          # Finished from cache; retired through done queue
+      return
+    self._used[0] += job._resources[0];
+    self._used[1] += job._resources[1];
+    job._held      = job._resources;                                                # Resources to free when job retires
+    if self._pool is not None:                                                      # Session may have to start; do so off the dispatcher
+      Thread( target = self._startSession, args = (job,), daemon = True ).start();
+      return
+    try:
+      job.start( nowait = True );                                                   # Start and do NOT wait to finish (non-blocking)
+    except Exception as err:                                                        # If could not start, e.g., IDL not found
+      job.log.error( 'Failed to start IDL job: {}'.format(err) );
+      job.failed = True;
+      job._finish();                                                                # Retired as failed through done queue
+
+  #############################################################################
+  def _startSession(self, job):
+    """
+    Get a session from the pool and start a job in it
+
+    Run in its own thread, so sessions that have to be started first start
+    in parallel, without holding up the dispatcher.
+
+    Arguments:
+      job (IDLJob) : Job to start
+
+    Returns:
+      None
+
+    """
+
+    try:
+      job.start( nowait = True, session = self._pool.acquire() );
+    except Exception as err:                                                        # If could not start, e.g., IDL not found
+      job.log.error( 'Failed to start IDL job: {}'.format(err) );
+      job.failed    = True;
+      job.startTime = job.startTime or time.time();
+      job._finish();                                                                # Retired as failed through done queue; session released
+
+  #############################################################################
+  def _batchSize(self):
+    """
+    Maximum number of jobs to start as a batch
+
+    Returns:
+      int : Batch size; 1 if not batching
+
+    """
+
+    if self.batch is None:
+      return 1
+    if self.batch == 'auto':
+      if self._meanWall is None:                                                    # Run single jobs until durations are known
+        return 1
+      size = int( self.batchTime / max( self._meanWall, 1.0e-3 ) );
+    else:
+      size = self.batch;
+    spread = -(-(len(self._queue)) // self.concurrency);                            # Pending jobs per slot, rounded up
+    return max( 1, min( size, spread ) )
+
+  #############################################################################
+  def _startBatch(self, jobs):
+    """
+    Start jobs to run one after another in one IDL process
+
+    The batch uses the resources of one job, freed when the last job
+    of the batch retires. Jobs found in the cache finish right away.
+
+    Arguments:
+      jobs (list) : Jobs to start; must all use the same resources
+
+    Returns:
+      None
+
+    """
+
+    for job in jobs:
+      job._held = (0, 0,);
+      self._jobs.append( job );
+      job.add_done_callback( self._done.put );
+    if self.cache is not None:
+      jobs = [job for job in jobs if not self.cache.fetch( job )];
+    if len(jobs) == 0:
+      return
+    jobs[-1]._held = jobs[-1]._resources;                                           # Jobs of batch finish in order
+    self._used[0] += jobs[-1]._held[0];
+    self._used[1] += jobs[-1]._held[1];
+    Thread( target = self._runBatch, args = (jobs,), daemon = True ).start();
+
+  #############################################################################
+  def _runBatch(self, jobs):
+    """
+    Run a batch of jobs in one IDLSession, finishing each in turn
+
+    Each job is followed by RETALL and the ready marker of the session, so
+    the success of each job is judged from its own sentinel, as when run
+    in its own process. If IDL exits during a job, e.g., by crashing, the
+    rest of the batch runs in a new session.
+
+    Arguments:
+      jobs (list) : Jobs to run
+
+    Returns:
+      None
+
+    """
+
+    session = None;
+    try:
+      for job in jobs:
+        try:
+          if session is None or not session.is_alive():
+            session = self._batchSession( session );
+          job.failed    = True;
+          job.startTime = time.time();
+          job._openLog();
+          session.run( job );
+        except Exception as err:                                                    # If could not start, e.g., IDL not found
+          job.log.error( 'Failed to run IDL job: {}'.format(err) );
+          job.failed = True;
+        job._finish();
+    finally:
+      if session is not None:
+        self._batchSession( session, replace = False );
+
+  #############################################################################
+  def _batchSession(self, session, replace = True):
+    """
+    Give back a session used for a batch and get a new one
+
+    Arguments:
+      session (IDLSession) : Session to give back; may be None
+
+    Keyword arguments:
+      replace (bool) : If set, get a new session
+
+    Returns:
+      IDLSession : New session from the pool, or started, if replace set
+
+    """
+
+    if session is not None:
+      if self._pool is not None:
+        self._pool.release( session );
+      else:
+        session.close();
+    if replace:
+      return IDLSession() if self._pool is None else self._pool.acquire()
+
+  #############################################################################
+  def _retire(self, job):
+    """
+    Record the result of a finished job and free its slot
+
+    Arguments:
+      job (IDLJob) : Job that finished
+
+    Returns:
+      None
+
+    """
+
+    self._jobs.remove( job );
+    self._used[0] -= job._held[0];
+    self._used[1] -= job._held[1];
+    self._npass   += int( not job.wait() );                                         # Count job if it did not fail
+    metrics = job.metrics();
+    metrics['cmd']                     = metrics['cmd'][:200];                      # Commands can be long, e.g., with array variables
+    metrics['cpus'], metrics['memory'] = job._resources;
+    self._metrics.append( metrics );
+    self._addTotals( job, metrics );
+    if job._session is not None:                                                    # If job ran in a session
+      self._pool.release( job._session );                                           # Return session to pool
+    if self.cache is not None and not job.failed:
+      self.cache.store( job );
+    if not job.cached and metrics['wallTime'] is not None:                          # Average wall time for batch sizes
+      wall           = metrics['wallTime'];
+      self._meanWall = wall if self._meanWall is None else 0.8 * self._meanWall + 0.2 * wall;
+
+  #############################################################################
+  def _addTotals(self, job, metrics):
+    """Add a finished job to the running totals of stats()"""
+
+    tot = self._totals;
+    tot['njobs']   += 1;
+    tot['nfailed'] += int( bool( job.failed ) );
+    if job.startTime is not None and job.endTime is not None:
+      tot['start'] = job.startTime if tot['start'] is None else min( tot['start'], job.startTime );
+      tot['end']   = job.endTime   if tot['end']   is None else max( tot['end'],   job.endTime );
+    if metrics['wallTime'] is not None:
+      tot['busy'] += metrics['wallTime'] * metrics['cpus'];
+    for key in ('cpuUser', 'cpuSystem'):
+      if metrics[key] is not None:
+        tot[key] = (tot[key] or 0) + metrics[key];
+    if metrics['maxRSS'] is not None:
+      tot['maxRSS'] = max( tot['maxRSS'] or 0, metrics['maxRSS'] );
+
+  #############################################################################
+  def stats(self):
+    """
+    Summarize the metrics of all jobs finished since clearMetrics()
+
+    Returns:
+      dict : njobs, nfailed, throughput (jobs per second between the first
+        start and last end), utilization (fraction of CPU slots busy over
+        that span), percentiles (p50, p90, p99, max) of queueWait and
+        wallTime, total cpuUser and cpuSystem, and largest maxRSS.
+        With adaptive concurrency, utilization is relative to the
+        maximum number of slots. Percentiles are of the last maxMetrics
+        jobs; all else is of all jobs
+
+    """
+
+    tot = self._totals;
+    out = {'njobs' : tot['njobs'], 'nfailed' : tot['nfailed']};
+    if tot['njobs'] == 0:
+      return out
+
+    span = None if tot['start'] is None else tot['end'] - tot['start'];
+    out['throughput']  = tot['njobs'] / span if span else None;
+    out['utilization'] = tot['busy'] / (span * self.maxConcurrency) if span else None;
+    for key in ('queueWait', 'wallTime'):
+      vals = [m[key] for m in self._metrics if m[key] is not None];
+      if len(vals) > 0:
+        out[key] = dict( zip( ('p50', 'p90', 'p99', 'max'), np.percentile( vals, [50, 90, 99, 100] ).tolist() ) );
+    for key in ('cpuUser', 'cpuSystem', 'maxRSS'):
+      out[key] = tot[key];
+    return out
+
+  #############################################################################
+  def exportMetrics(self, path):
+    """
+    Write the metrics of finished jobs to a file
+
+    Arguments:
+      path (str) : Output file. If it ends in .csv, one row per job is
+        written; otherwise JSON with the per-job metrics and stats().
+        Only the last maxMetrics jobs are written
+
+    Returns:
+      None
+
+    """
+
+    metrics = list( self._metrics );
+    if path.endswith('.csv'):
+      with open(path, 'w', newline = '') as fid:
+        writer = csv.DictWriter( fid, fieldnames = list( metrics[0] ) if len(metrics) > 0 else [] );
+        writer.writeheader();
+        writer.writerows( metrics );
+    else:
+      with open(path, 'w') as fid:
+        json.dump( {'stats' : self.stats(), 'jobs' : metrics}, fid, indent = 2 );
+
+  #############################################################################
+  def clearMetrics(self):
+    """Discard the metrics of finished jobs"""
+
+    self._metrics.clear();
+    self._totals = {'njobs' : 0, 'nfailed' : 0, 'start' : None, 'end' : None, 'busy' : 0.0,
+                    'cpuUser' : None, 'cpuSystem' : None, 'maxRSS' : None};
+
+  #############################################################################
+  def close(self):
+    """Exit any IDL sessions kept by the queue"""
+
+    if self._pool is not None:
+      self._pool.close();
+
+  #############################################################################
+  def __reset(self):
+    """ Method to 're-initialize' the class"""
+    self._queue   = [];
+    self._seq     = 0;
+    self._used    = [0, 0];
+    self._njobs   = 0
+    self._jobs    = [];
+    self._npass   = 0;
+    self._thread  = None;
+
+##############################################################################
+class IDLExecutor( IDLAsyncQueue, Executor ):
+  """
+  A concurrent.futures.Executor that runs IDLJobs
+
+  A dispatcher thread runs for the life of the executor, so jobs can be
+  submitted at any time and start as soon as resources are free; jobs are
+  scheduled by priority and resources as in IDLAsyncQueue. Each submitted
+  job gets a Future whose result is the job, once finished, from which
+  the failed state, returncode, and submitTime, startTime, and endTime
+  can be read. map() takes a function that builds the IDLJob for each
+  set of arguments, and yields the finished jobs.
+
+  Example:
+    with IDLExecutor( concurrency = 8 ) as executor:
+      futures = [executor.submit( job ) for job in jobs]
+      for future in as_completed( futures ):
+        job = future.result()
+
+  """
+
+  def __init__(self, concurrency = NCPU, sessions = False, memory = None, cache = None,
+                     batch = None, batchTime = 2.0, adaptive = False, minConcurrency = 1,
+                     adaptInterval = 5.0, maxMetrics = 10000):
+    """
+    Keyword arguments:
+      See IDLAsyncQueue
+
+    """
+
+    IDLAsyncQueue.__init__( self, concurrency = concurrency, sessions = sessions, memory = memory,
+                            cache = cache, batch = batch, batchTime = batchTime, adaptive = adaptive,
+                            minConcurrency = minConcurrency, adaptInterval = adaptInterval,
+                            maxMetrics = maxMetrics );
+    self._lock     = Lock();                                                    # Protects submitted jobs, futures, and shutdown state
+    self._inbox    = [];                                                        # Entries of jobs submitted since the dispatcher last looked
+    self._futures  = {};                                                        # Future of each pending or running job; only changed under _lock
+    self._shutdown = False;
+    self._thread   = Thread( target = self._serve, name = 'IDLExecutor', daemon = True );
+    self._thread.start();
+
+  #############################################################################
+  def submit(self, job, priority = 0, cpus = 1, memory = 0):
+    """
+    Submit an IDLJob to be run
+
+    Arguments:
+      job (IDLJob)  : Job to run
+
+    Keyword arguments:
+      See IDLAsyncQueue.submitJob()
+
+    Returns:
+      concurrent.futures.Future : Future whose result is the job once it
+        finished
+
+    """
+
+    if not isinstance( job, IDLJob ):
+      raise TypeError( 'Can only submit IDLJob objects' )
+    future = Future();
+    with self._lock:
+      if self._shutdown:
+        raise RuntimeError( 'Cannot submit jobs after shutdown' )
+      self._inbox.append( self._entry( job, priority, cpus, memory ) );         # Moved to the pending heap by the dispatcher
+      self._futures[job] = future;
+    self._done.put( None );                                                     # Wake dispatcher
+    return future
+
+  #############################################################################
+  def submitJob(self, job, priority = 0, cpus = 1, memory = 0):
+    """Same as submit(); jobs must have a future to be started"""
+
+    return self.submit( job, priority = priority, cpus = cpus, memory = memory )
+
+  #############################################################################
+  def startJobs(self, nowait = False):
+    """Not used; jobs start when submitted"""
+
+    raise RuntimeError( 'IDLExecutor starts jobs when submitted; use submit()' )
+
+  #############################################################################
+  def join(self):
+    """Not used; wait on the futures, or call shutdown()"""
+
+    raise RuntimeError( 'IDLExecutor has no join(); wait on the futures or use shutdown()' )
+
+  #############################################################################
+  def map(self, fn, *iterables, timeout = None, chunksize = 1):
+    """
+    Run the IDLJob built by fn for each set of arguments
+
+    Like Executor.map(), but fn is called right away, in this thread, and
+    must return an IDLJob; the job is submitted and the finished job is
+    yielded in place of the result of fn.
+
+    Example:
+      for job in executor.map( lambda path: IDLJob( 'process, file', file = path ), paths ):
+        print( job.failed )
+
+    Arguments:
+      fn : Function that returns an IDLJob
+      *iterables : Arguments of fn, as for map()
+
+    Keyword arguments:
+      timeout (float) : Maximum time, in seconds, to wait for the jobs,
+        from the call to map(). Default is no limit
+      chunksize (int) : Ignored; for compatibility with Executor.map()
+
+    Returns:
+      generator : The finished jobs, in the order of the arguments
+
+    """
+
+    end     = None if timeout is None else time.monotonic() + timeout;
+    futures = [self.submit( fn( *args ) ) for args in zip( *iterables )];
+    def results():
+      try:
+        futures.reverse();                                                      # Pop from end, dropping references to yielded jobs
+        while len(futures) > 0:
+          future = futures.pop();
+          yield future.result( None if end is None else end - time.monotonic() );
+      finally:
+        for future in futures:                                                  # If stopped early, cancel jobs not started
+          future.cancel();
+    return results()
+
+  #############################################################################
+  def shutdown(self, wait = True, cancel_futures = False):
+    """
+    Stop accepting jobs and exit the dispatcher once all jobs have run
+
+    Keyword arguments:
+      wait (bool) : If set (default), block until all jobs have finished
+      cancel_futures (bool) : If set, cancel jobs that have not started
+
+    """
+
+    with self._lock:
+      self._shutdown = True;
+      futures        = list( self._futures.values() ) if cancel_futures else [];
+    for future in futures:                                                      # Futures of running jobs are not cancelled
+      future.cancel();
+    self._done.put( None );                                                     # Wake dispatcher
+    if wait:
+      self._thread.join();
+
+  #############################################################################
+  def _serve(self):
+    """
+    Dispatcher; start jobs as resources free until shut down and idle
+
+    Blocks until a job finishes or is submitted, then retires all
+    finished jobs and starts pending jobs that fit. The lock is only held
+    to take submitted jobs and to look up futures; jobs are started,
+    cached, and their futures resolved without it, so done callbacks may
+    submit jobs and submit() does not wait on IDL or the cache.
+
+    """
+
+    while True:
+      with self._lock:
+        inbox, self._inbox = self._inbox, [];
+        shutdown           = self._shutdown;
+      for entry in inbox:
+        heapq.heappush( self._queue, entry );
+      if shutdown:
+        self._dropCancelled();
+      self._dispatch();
+      if shutdown and len(self._queue) == 0 and len(self._jobs) == 0:
+        break
+      items = [self._done.get()];                                               # Block until job finishes or is submitted
+      while True:
+        try:
+          items.append( self._done.get_nowait() );
+        except Empty:
+          break
+      for job in items:
+        if job is not None:                                                     # None is a wake up
+          self._retire( job );
+    self.close();
+
+  #############################################################################
+  def _dropCancelled(self):
+    """Remove pending jobs whose futures were cancelled"""
+
+    keep = [entry for entry in self._queue if not self._futures[entry[2]].cancelled()];
+    if len(keep) == len(self._queue):
+      return
+    with self._lock:
+      for entry in self._queue:
+        if self._futures[entry[2]].cancelled():
+          del self._futures[entry[2]];
+    heapq.heapify( keep );
+    self._queue = keep;
+
+  #############################################################################
+  def _startJob(self, job):
+    """Start a job unless its future was cancelled"""
+
+    if self._futures[job].set_running_or_notify_cancel():
+      IDLAsyncQueue._startJob( self, job );
+    else:
+      with self._lock:
+        del self._futures[job];
+
+  #############################################################################
+  def _startBatch(self, jobs):
+    """Start a batch of the jobs whose futures were not cancelled"""
+
+    keep = [job for job in jobs if self._futures[job].set_running_or_notify_cancel()];
+    if len(keep) < len(jobs):
+      with self._lock:
+        for job in jobs:
+          if self._futures[job].cancelled():
+            del self._futures[job];
+    if len(keep) > 0:
+      IDLAsyncQueue._startBatch( self, keep );
+
+  #############################################################################
+  def _retire(self, job):
+    """Free resources of a finished job and resolve its future"""
+
+    IDLAsyncQueue._retire( self, job );
+    with self._lock:
+      future = self._futures.pop( job );
+    future.set_result( job );                                                   # Runs done callbacks; must not hold the lock
+
+##############################################################################
+class IDLAsyncioQueue( object ):
+  """
+  Run IDLJobs from an asyncio event loop
+
+  The asyncio equivalent of IDLAsyncQueue. Each submitted job runs as a
+  task, with a semaphore bounding how many IDL processes run at once, so
+  any number of jobs can be supervised from one event loop without
+  threads. Jobs submitted at any time start as soon as a slot is free.
+
+  Example:
+    queue = IDLAsyncioQueue( concurrency = 8 )
+    for job in jobs:
+      queue.submitJob( job )
+    nsuccess, ntot = await queue.join()
+
+  """
+
+  def __init__(self, concurrency = NCPU):
+    self.concurrency = concurrency
+    self._sem        = None;                                                    # Created in the event loop on first submit
+    self._tasks      = [];
+
+  #############################################################################
+  def submitJob(self, job):
+    """
+    Submit an IDLJob to run as soon as a slot is free
+
+    Must be called from within the running event loop.
+
+    Arguments:
+      job (IDLJob)  : An IDLJob instance to run
+
+    Keyword arguments:
+      None.
+
+    Returns:
+      asyncio.Task : Task that runs the job; its result is the failed
+        state of the job
+
+    """
+
+    if self._sem is None:
+      self._sem = asyncio.Semaphore( self.concurrency );
+    task = asyncio.ensure_future( self._runJob( job ) );
+    self._tasks.append( task );
+    return task
+
+  #############################################################################
+  async def join(self):
+    """
+    Wait for all submitted jobs to finish
+
+    Returns:
+      tuple: first element is number of jobs that ran
+        successfully and second element is total number of jobs run.
+        Jobs that raised or were cancelled count as failed.
+
+    """
+
+    tasks       = self._tasks;
+    self._tasks = [];
+    failed      = await asyncio.gather( *tasks, return_exceptions = True );           # One job raising does not lose the others
+    return failed.count( False ), len(failed)
+
+  #############################################################################
+  async def _runJob(self, job):
+    """Run job once a slot is free"""
 
+    async with self._sem:
+      return await job.run()
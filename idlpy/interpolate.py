@@ -0,0 +1,457 @@
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Use the compiled kernels if available, else fall back to the NumPy versions
+# of the same kernels. Setting IDLPY_BACKEND=numpy forces the NumPy kernels;
+# setting IDLPY_BACKEND=cython requires the compiled kernels
+_BACKEND = os.environ.get('IDLPY_BACKEND', '').lower()                                  # Backend requested, if any
+try:
+  if _BACKEND == 'numpy':
+    raise ImportError( 'NumPy backend requested by IDLPY_BACKEND' )
+  from ._interpolate import ( _buildTaps, _locate,
+                              _gather1d, _gather2d, _gather3d, _gather2d_points, _gather3d_points,
+                              _gathernd, _gathernd_points )
+  BACKEND = 'cython'                                                                    # Name of backend in use
+except ImportError as err:
+  if _BACKEND == 'cython':                                                              # Compiled kernels required; do not fall back
+    raise
+  from ._interpolate_numpy import ( _buildTaps, _locate,
+                                    _gather1d, _gather2d, _gather3d, _gather2d_points, _gather3d_points,
+                                    _gathernd, _gathernd_points )
+  BACKEND = 'numpy'                                                                     # Name of backend in use
+  if _BACKEND != 'numpy':                                                               # If fall back was not requested
+    log.warning( 'Compiled interpolation kernels unavailable ({}); using NumPy backend'.format(err) )
+
+NATIVE_TYPES = (np.uint8, np.int16, np.uint16, np.int32, np.int64, np.float32, np.float64)   # Data types the kernels run on without conversion
+
+_NUM_THREADS = ContextVar( 'num_threads', default = 0 )                                 # Default number of kernel threads, per thread or task; OpenMP default if not positive
+
+@contextmanager
+def threads( n ):
+  """
+  Set the number of threads used by the interpolation kernels
+
+  Within the context, all interpolation that does not set num_threads
+  explicitly uses n threads. Use n = 1 when interpolating inside worker
+  processes or threads to stop OpenMP from oversubscribing the CPUs. The
+  setting only applies to the thread, or asyncio task, that entered the
+  context.
+
+  Example:
+    with threads( 1 ):
+      out = interpolate( data, zid, yid, xid )
+
+  Arguments:
+    n (int) : Number of threads; if not positive, the OpenMP default
+
+  """
+
+  token = _NUM_THREADS.set( int( n ) )
+  try:
+    yield
+  finally:
+    _NUM_THREADS.reset( token )
+
+class Interpolator( object ):
+  """
+  Reusable interpolation plan
+
+  The neighbour indices, weights, and out-of-bounds masks along each axis
+  are computed once from the interpolation indices. Calling the instance
+  on a data array is then a single gather-and-blend pass, so applying the
+  same target grid (or set of points) to many fields skips all of the
+  index computations.
+
+  Example:
+    plan = Interpolator( data.shape, zid, yid, xid, missing = np.nan )
+    for field in fields:
+      out = plan( field )
+
+  """
+
+  def __init__(self, shape, *args, **kwargs):
+    """
+    Initialize the plan
+
+    Arguments:
+      shape (tuple) : Shape of the data arrays that will be interpolated
+      *args (numpy.ndarray) : Indices to interpolate to, one array per
+        dimension of the data in the same order as the data; i.e, (z, y, x)
+
+    Keyword arguments:
+      cubic (float) : Cubic interpolation parameter; see interpolate()
+      grid (bool) : If set (default), interpolate on the grid formed by the
+        outer product of the index arrays, else at scattered points
+      double (bool) : If set (default), weights are computed and applied in
+        double precision, else single precision is used
+      missing : Default value for elements outside the bounds of data
+      nan (bool) : If set, NaN values in data are treated as missing; see
+        __call__
+      num_threads (int) : Default number of threads; see __call__
+
+    """
+
+    self.dims    = tuple( shape )                                                       # Shape of data the plan applies to
+    self.grid    = kwargs.get('grid', True)                                             # Get grid keyword
+    self.missing = kwargs.get('missing', None)                                          # Get missing keyword
+    self.nan     = kwargs.get('nan', False)                                             # Get nan keyword
+    self.threads = kwargs.get('num_threads', None)                                      # Get num_threads keyword
+    cubic        = kwargs.get('cubic', None)                                            # Get cubic keyword
+    idType       = np.float64 if kwargs.get('double', True) else np.float32             # Type for indices and weights
+
+    nargs = len(args)                                                                   # Get number of arguments
+    if nargs == 0:                                                                      # If no index arrays
+      raise Exception( 'Must input at least one array of indices' )
+    if nargs != len(self.dims):                                                         # If not one index array per dimension
+      raise Exception( 'Number of index arrays must match number of data dimensions' )
+
+    if cubic:                                                                           # If cubic interpolation requested
+      if cubic > 0:                                                                     # As in IDL, values greater than zero
+        cubic = -1.0                                                                    # Use parameter of -1
+    else:
+      cubic = 0.0                                                                       # Linear interpolation
+
+    args  = list( args )                                                                # Convert args tuple to list
+    for i in range( nargs ):                                                            # Iterate over all values
+      if not isinstance(args[i], np.ndarray):                                           # If the argument is not a ndarray
+        if not isinstance(args[i], (list, tuple,)):                                     # If arg is not list or tuple
+          args[i] = (args[i],)                                                          # Convert to tuple
+        args[i] = np.asarray( args[i], dtype = idType )                                 # Convert to ndarray
+      elif args[i].dtype != idType:                                                     # Else, if not the computation type
+        args[i] = args[i].astype( idType )                                              # Cast to computation type
+
+    if self.grid:                                                                       # If grid interpolation
+      self.shape = tuple( arg.size for arg in args )                                    # Output shape is outer product of indices
+      args       = [arg.ravel() for arg in args]                                        # Taps computed from 1D index arrays
+    else:                                                                               # Else, point interpolation
+      if any( arg.size != args[0].size for arg in args ):                               # If number of points differ
+        raise Exception( 'Index arrays must have the same number of elements' )
+      self.shape = args[0].shape                                                        # Output has shape of index arrays
+      args       = [arg.ravel() for arg in args]                                        # Taps computed from 1D index arrays
+
+    self._taps = []                                                                     # Neighbour indices, weights, and out-of-bounds flags per axis
+    for arg, n in zip( args, self.dims ):                                               # Iterate over axes
+      oob = (arg < 0) | (arg > (n-1))                                                   # Locate any out-of-bound indices
+      self._taps.append( _buildTaps( arg, n, cubic ) + (oob.view( np.uint8 ),) )       # Compute neighbours and weights
+
+  def __call__(self, data, **kwargs):
+    """
+    Interpolate data using the plan
+
+    Arguments:
+      data (numpy.ndarray) : Data to interpolate; the trailing dimensions
+        must match the shape the plan was created for. Any leading
+        dimensions are treated as a stack of arrays that are all
+        interpolated in a single parallel pass. May be a numpy.memmap.
+
+    Keyword arguments:
+      missing : Value for elements outside the bounds of data; overrides
+        the value given when the plan was created
+      nan (bool) : If set, NaN neighbours are skipped and the weights of
+        the remaining neighbours renormalized. Elements with only NaN
+        neighbours are NaN. Overrides the value given when the plan was
+        created; has no effect on integer data
+      out (numpy.ndarray) : Array to write the result to, e.g., a
+        numpy.memmap. Must have the output shape and type of data
+      chunk (int) : If set, process the data in tiles of this many output
+        elements along the first interpolated dimension. Only the planes of
+        data that each tile needs are read into memory, so data and out
+        may be memory-mapped arrays larger than memory. Stacks of arrays
+        are processed one array at a time. Only available with grid
+        interpolation
+      num_threads (int) : Number of threads the kernels use. Overrides the
+        value given when the plan was created. If neither is set, the
+        value set with threads() is used, else the OpenMP default
+
+    Returns:
+      numpy.ndarray : Interpolated data, same type as input data. The shape
+        is the leading dimensions of data followed by the plan output shape
+
+    """
+
+    ndims = len(self.dims)                                                              # Number of interpolated dimensions
+    if data.shape[data.ndim-ndims:] != self.dims:                                       # If wrong shape
+      raise Exception( 'Data shape {} does not match plan shape {}'.format(data.shape, self.dims) )
+    batch = data.shape[:data.ndim-ndims]                                                # Leading (batch) dimensions
+
+    out = kwargs.get('out', None)                                                       # Get output array
+    if out is None:                                                                     # If no output array
+      out = np.empty( batch + self.shape, dtype = data.dtype )                          # Allocate output
+    elif out.shape != batch + self.shape or out.dtype != data.dtype:                    # Else, if output array does not match
+      raise Exception( 'Output array must have shape {} and type {}'.format(batch + self.shape, data.dtype) )
+
+    missing = kwargs.get('missing', self.missing)                                       # Get missing value
+    skipnan = kwargs.get('nan', self.nan)                                               # Get nan keyword
+    chunk   = kwargs.get('chunk', None)                                                 # Get chunk keyword
+    nthread = kwargs.get('num_threads', self.threads)                                   # Get num_threads keyword
+    if nthread is None:                                                                 # If not set for call or plan
+      nthread = _NUM_THREADS.get()                                                      # Use default from threads()
+    if chunk is None:                                                                   # If not chunking
+      self._apply( data, self._taps, out, missing, skipnan, nthread )                   # Interpolate all data in one pass
+      return out
+
+    if not self.grid:                                                                   # If point interpolation
+      raise Exception( 'Chunked interpolation only supported with grid' )
+    idx, w, oob = self._taps[0]                                                         # Taps along first interpolated dimension
+    for bid in np.ndindex( *batch ):                                                    # Iterate over arrays in stack
+      for k0 in range( 0, self.shape[0], chunk ):                                       # Iterate over tiles
+        k1   = min( k0 + chunk, self.shape[0] )                                         # End of tile
+        lo   = idx[k0:k1].min()                                                         # First plane of data needed by tile
+        hi   = idx[k0:k1].max() + 1                                                     # One past last plane of data needed by tile
+        taps = [(idx[k0:k1] - lo, w[k0:k1], oob[k0:k1])] + self._taps[1:]               # Taps for tile, relative to first plane
+        self._apply( data[bid][lo:hi], taps, out[bid][k0:k1], missing, skipnan, nthread )  # Interpolate tile into output
+    return out
+
+  def _apply(self, data, taps, out, missing, skipnan, nthread):
+    """
+    Run the gather kernel for the given taps on data, writing to out
+
+    Arguments:
+      data (numpy.ndarray) : Data to interpolate, with optional leading
+        batch dimensions
+      taps (list) : (indices, weights, flags) for each interpolated dimension
+      out (numpy.ndarray) : Output array, type of data
+      missing : Value for elements outside the bounds of data, or None
+      skipnan (bool) : Skip NaN neighbours
+      nthread (int) : Number of kernel threads; OpenMP default if not positive
+
+    Returns:
+      None
+
+    """
+
+    ndims = len(taps)                                                                   # Number of interpolated dimensions
+    if data.dtype not in NATIVE_TYPES:                                                  # If kernels cannot run on the data type
+      data = data.astype( np.float64 )                                                  # Convert to 64-bit float
+    data = np.ascontiguousarray( data )                                                 # Kernels require C-contiguous data; no copy if already is
+    data = data.reshape( (-1,) + data.shape[data.ndim-ndims:] )                         # Collapse batch dimensions to one leading dimension
+
+    if self.grid:                                                                       # If grid interpolation
+      shape = (data.shape[0],) + tuple( tap[0].shape[0] for tap in taps )               # Kernel output shape
+    else:                                                                               # Else, point interpolation
+      shape = (data.shape[0], taps[0][0].shape[0],)                                     # Kernel output shape
+    direct = out.dtype == data.dtype and out.flags['C_CONTIGUOUS']                      # Whether kernels can write output directly
+    if direct:
+      res = out.reshape( shape )                                                        # View of output with one batch dimension
+    else:
+      res = np.empty( shape, dtype = data.dtype )                                       # Temporary output
+
+    if missing is None:                                                                 # If missing value not set
+      fill = np.empty( (0,), dtype = data.dtype )                                       # Empty fill tells kernels not to check bounds
+    else:
+      fill = np.array( (missing,), dtype = data.dtype )                                 # Fill value in type of data
+    skipnan = bool(skipnan) and data.dtype.kind == 'f'                                  # Only floating point data can have NaN
+
+    if ndims > 3:                                                                       # Drop size-1 axes so fewer dimensions are blended
+      keep = [a for a in range( ndims )
+                if data.shape[a+1] > 1 or (fill.size > 0 and taps[a][2].any())]       # Axes that change the result
+      if len(keep) == 0:                                                                # All axes size 1; keep one
+        keep = [ndims-1]
+      if len(keep) < ndims:
+        sub = data.reshape( (data.shape[0],) + tuple( data.shape[a+1] for a in keep ) ) # Data without dropped axes
+        if self.grid:                                                                   # Result is constant along dropped axes
+          part = np.empty( (data.shape[0],) + tuple( taps[a][0].shape[0] for a in keep ), dtype = data.dtype )
+          self._apply( sub, [taps[a] for a in keep], part, missing, skipnan, nthread )
+          bcast = tuple( shape[a+1] if a in keep else 1 for a in range( ndims ) )
+          res[...] = part.reshape( (data.shape[0],) + bcast )
+        else:
+          self._apply( sub, [taps[a] for a in keep], res, missing, skipnan, nthread )
+        if not direct:                                                                  # If temporary output used
+          out[...] = res.reshape( out.shape )                                           # Copy, converting back to output type
+        return
+
+    if ndims > 3:                                                                       # If more than 3 dimensions, use N-dimensional kernels
+      counts  =np.array( [tap[0].shape[0] for tap in taps], dtype = np.intp )          # Number of taps along each dimension
+      offsets = np.concatenate( ([0], np.cumsum( counts[:-1] )) ).astype( np.intp )     # Start of each dimension in stacked taps
+      strides = np.array( data.strides[1:], dtype = np.intp ) // data.itemsize          # Element strides of spatial dimensions
+      stacked = [np.concatenate( [tap[i] for tap in taps] ) for i in range(3)]          # Stacked indices, weights, and flags
+      data    = data.reshape( data.shape[0], -1 )                                       # Flatten spatial dimensions
+      res     = res.reshape( res.shape[0], -1 )                                         # Flatten output grid or points
+      if self.grid:
+        _gathernd( data, *stacked, offsets, counts, strides, res, fill, skipnan, nthread )
+      else:
+        _gathernd_points( data, *stacked, offsets, counts, strides, res, fill, skipnan, nthread )
+      if not direct:                                                                    # If temporary output used
+        out[...] = res.reshape( out.shape )                                             # Copy, converting back to output type
+      return
+
+    taps = [val for tap in taps for val in tap]                                         # Flatten to (indices, weights, flags) per axis
+    if self.grid:                                                                       # If grid interpolation
+      if ndims == 1:
+        _gather1d( data, *taps, res, fill, skipnan, nthread )
+      elif ndims == 2:
+        _gather2d( data, *taps, res, fill, skipnan, nthread )
+      else:
+        _gather3d( data, *taps, res, fill, skipnan, nthread )
+    else:                                                                               # Else, point interpolation
+      if ndims == 1:
+        _gather1d( data, *taps, res, fill, skipnan, nthread )
+      elif ndims == 2:
+        _gather2d_points( data, *taps, res, fill, skipnan, nthread )
+      else:
+        _gather3d_points( data, *taps, res, fill, skipnan, nthread )
+
+    if not direct:                                                                      # If temporary output used
+      out[...] = res.reshape( out.shape )                                               # Copy, converting back to output type
+
+def interpolate( data, *args, **kwargs ):
+  """
+  Interpolate N-dimensional data similar to IDL INTERPOLATE() function
+
+  By default, this function acts just like the IDL INTERPOLATE() function
+  when the /GRID keyword is set. Input arguments are more strict in that if a
+  2D array is input, interpolation indices for both diemensions must be
+  input. Setting grid=False interpolates at scattered points instead, with
+  one output value per element of the index arrays.
+
+  Arguments:
+    data (numpy.ndarray) : The array of data values to interpolate. 
+      Can be of any dimension; 1D, 2D, and 3D data use dedicated kernels,
+      more dimensions use a general N-dimensional kernel. If data has more dimensions than there are
+      index arrays, the leading dimensions are treated as a stack of
+      arrays that are all interpolated in one call; e.g., 4D (t, z, y, x)
+      data with three index arrays.
+    *args (numpy.ndarray) : Indices to interpolat to.
+      For 1D data, only one (1) array of indices is input.
+      For 2D data, two (2) arraus of indices are input.
+      For 3D data, three (3) arrays of indices are input.
+      For ND data, N arrays of indices are input.
+      The order of array input matches the ordering of the data array; i.e, (z, y, x)
+
+  Keyword arguments:
+    cubic (float) : Set to a value between -1 and 0 to use cubic convolution
+      interpolation with the given interpolation parameter; a value of -0.5
+      is recommended. Values greater than zero use a parameter of -1.
+    grid (bool) : If set (default), interpolate on the grid formed by the
+      outer product of the index arrays. If not set, the index arrays must
+      all have the same number of elements and give the location of each
+      point to interpolate to; the output has the shape of the index arrays.
+    double (bool) : If set, indices and intermediate values are computed in
+      double precision, else single precision is used. Default is single
+      precision for float32 data and double precision for all other types.
+    missing : The value to return for elements outside the bounds of data.
+    nan (bool) : If set, NaN values in data are skipped and the weights of
+      the remaining neighbours renormalized.
+    out (numpy.ndarray) : Array to write the result to, e.g., a numpy.memmap.
+      Must have the output shape and the type of data.
+    chunk (int) : If set, interpolate in tiles of this many elements along
+      the first interpolated dimension, reading only the planes of data each
+      tile needs. Use with memory-mapped data and out to interpolate arrays
+      larger than memory. Only available with grid interpolation.
+    num_threads (int) : Number of threads to use. If not set, the value set
+      with threads() is used, else the OpenMP default.
+
+  Return:
+    numpy.ndarray : Interpolated data, same type as input data
+
+  Note:
+    Data of type uint8, int16, uint16, int32, int64, float32, and float64
+    are interpolated without conversion. All other types are converted
+    to float64 for interpolation and the result cast back to input type.
+
+    To interpolate many data arrays to the same locations, create an
+    Interpolator once and call it on each array instead.
+
+    If the compiled extension is not available, vectorised NumPy versions
+    of the kernels are used. The backend in use is given by BACKEND in this
+    module (INTERPOLATE_BACKEND in the idlpy package); 'cython' or 'numpy'.
+ 
+  """
+
+  double = kwargs.get('double', None)                                                   # Get computation precision
+  if double is None:                                                                    # If precision not set
+    double = data.dtype != np.float32                                                   # Use single precision for float32 only
+  plan = Interpolator( data.shape[data.ndim-len(args):], *args,
+                       grid   = kwargs.get('grid', True),
+                       cubic  = kwargs.get('cubic', None),
+                       double = double )                                                # Compute neighbours and weights
+  return plan( data, missing     = kwargs.get('missing', None),
+                     nan         = kwargs.get('nan', False),
+                     out         = kwargs.get('out', None),
+                     chunk       = kwargs.get('chunk', None),
+                     num_threads = kwargs.get('num_threads', None) )                    # Return interpolated data
+
+def interp1d( data, xid, num_threads = None ):
+  """Perform linear interpolation on 1D data; same as interpolate( data, xid )"""
+
+  return interpolate( data, xid, num_threads = num_threads )
+
+def interp2d( data, yid, xid, num_threads = None ):
+  """Perform bi-linear interpolation on 2D data; same as interpolate( data, yid, xid )"""
+
+  return interpolate( data, yid, xid, num_threads = num_threads )
+
+def interp3d( data, zid, yid, xid, num_threads = None ):
+  """Perform tri-linear interpolation on 3D data; same as interpolate( data, zid, yid, xid )"""
+
+  return interpolate( data, zid, yid, xid, num_threads = num_threads )
+
+def interpol( data, x, xout, **kwargs ):
+  """
+  Interpolate data given on coordinates, similar to IDL INTERPOL() function
+
+  Instead of fractional indices, the coordinates of the data and of the
+  points to interpolate to are input. The indices are found by a compiled
+  search along each coordinate, using the spacing directly if the
+  coordinates are uniform, and the data interpolated as by interpolate().
+
+  Arguments:
+    data (numpy.ndarray) : The array of data values to interpolate
+    x : Coordinates of the last dimension of data; strictly increasing or
+      decreasing. For more than one dimension, a tuple with the
+      coordinates of each of the trailing dimensions of data, in the
+      order of the data; i.e, (z, y, x). Leading dimensions of data not
+      covered by x are treated as a stack, as in interpolate()
+    xout : Coordinates to interpolate to. For more than one dimension, a
+      tuple with one array per element of x
+
+  Keyword arguments:
+    All keywords of interpolate() are accepted. Note that cubic
+      convolution works on indices, so is only exact for uniform
+      coordinates.
+
+  Return:
+    numpy.ndarray : Interpolated data, same type as input data
+
+  Note:
+    Unlike IDL INTERPOL, values at coordinates outside of x are not
+    extrapolated; the nearest edge value is returned, or the value of the
+    missing keyword if set.
+
+  Example:
+    # Interpolate (time, pressure, lat, lon) data to new pressure levels
+    out = interpol( data, (plev, lat, lon), (newlev, lat, lon) )
+
+  """
+
+  if not isinstance( x, tuple ):                                                        # If single dimension
+    x, xout = (x,), (xout,)
+  if len(x) != len(xout):
+    raise Exception( 'Must input one array of output coordinates per coordinate array' )
+
+  double = kwargs.get('double', None)                                                   # Get computation precision of weights
+  if double is None:                                                                    # If precision not set
+    double = data.dtype != np.float32                                                   # Use single precision for float32 only
+  nthread = kwargs.get('num_threads', None)                                             # Get num_threads keyword
+  if nthread is None:                                                                   # If not set
+    nthread = _NUM_THREADS.get()                                                        # Use default from threads()
+
+  dims = data.shape[data.ndim-len(x):]                                                  # Interpolated dimensions of data
+  ids  = []
+  for coord, target, n in zip( x, xout, dims ):                                         # Iterate over dimensions
+    coord  = np.asarray( coord )
+    eps    = np.finfo( coord.dtype if coord.dtype.kind == 'f' else np.float64 ).eps    # Precision of coordinates, for uniform spacing test
+    coord  = coord.astype( np.float64 ).ravel()                                         # Located in double precision whatever the data type,
+    target = np.asarray( target, dtype = np.float64 )                                   # so, e.g., times are not rounded to the data precision
+    if coord.size != n:
+      raise Exception( 'Coordinate array of size {} does not match data dimension of size {}'.format(coord.size, n) )
+    ids.append( _locate( coord, target.ravel(), nthread, eps ).reshape( target.shape ) )  # Fractional indices of output coordinates
+
+  kwargs['double'] = double
+  return interpolate( data, *ids, **kwargs )
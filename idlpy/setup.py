@@ -1,13 +1,20 @@
+import sys
 from distutils.core import setup
 from distutils.extension import Extension
 from Cython.Build import cythonize, build_ext
 import numpy
 
+if sys.platform == 'win32':                                                             # MSVC
+  cflags, lflags = ['/openmp'], []
+elif sys.platform == 'darwin':                                                          # Apple clang needs the OpenMP runtime from libomp
+  cflags, lflags = ['-Xpreprocessor', '-fopenmp'], ['-lomp']
+else:                                                                                   # GCC and clang; the driver links its own runtime
+  cflags, lflags = ['-fopenmp'], ['-fopenmp']
 
-exts = [Extension( name='interpolate',
-        sources=['interpolate.pyx'],
-        extra_compile_args=['-fopenmp'],
-        extra_link_args=['-lomp']
+exts = [Extension( name='_interpolate',
+        sources=['_interpolate.pyx'],
+        extra_compile_args=cflags,
+        extra_link_args=lflags
 )]
 
 setup(
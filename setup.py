@@ -1,4 +1,6 @@
-import os, shutil, importlib
+import os, sys, shutil, importlib
+from distutils import log
+from distutils.errors import CompileError, LinkError
 from setuptools import setup, convert_path, find_packages, Extension
 from setuptools.command.install import install
 try:
@@ -25,11 +27,45 @@ ver_path = convert_path("{}/version.py".format(NAME))
 with open(ver_path) as ver_file:
   exec(ver_file.read(), main_ns);
 
+def openmpFlags( compiler ):
+  """
+  Compile and link arguments that enable OpenMP for a compiler
+
+  Arguments:
+    compiler (CCompiler) : Compiler used by build_ext
+
+  Returns:
+    tuple : Lists of compile and link arguments
+
+  """
+
+  if compiler.compiler_type == 'msvc':
+    return ['/openmp'], []
+  if sys.platform == 'darwin':                                                          # Apple clang needs the OpenMP runtime from libomp
+    return ['-Xpreprocessor', '-fopenmp'], ['-lomp']
+  return ['-fopenmp'], ['-fopenmp']                                                     # GCC and clang; the driver links its own runtime
+
+class openmp_build_ext( build_ext ):
+  """Build extensions with the OpenMP flags of the compiler in use"""
+
+  def build_extension(self, ext):
+    cflags, lflags = openmpFlags( self.compiler )
+    compile_args   = list( ext.extra_compile_args )
+    link_args      = list( ext.extra_link_args )
+    ext.extra_compile_args = compile_args + cflags
+    ext.extra_link_args    = link_args    + lflags
+    try:
+      build_ext.build_extension( self, ext )
+    except (CompileError, LinkError):                                                   # No OpenMP; kernels still build, but run on one thread
+      log.warn( 'building {} without OpenMP'.format( ext.name ) )
+      ext.extra_compile_args = compile_args
+      ext.extra_link_args    = link_args
+      build_ext.build_extension( self, ext )
+
 exts = [
-  Extension( '{}.interpolate'.format(NAME),
-             sources            = ['{}/interpolate.pyx'.format(NAME)],
-             extra_compile_args = ['-fopenmp'],
-             extra_link_args    = ['-lomp']
+  Extension( '{}._interpolate'.format(NAME),
+             sources            = ['{}/_interpolate.pyx'.format(NAME)],
+             optional           = True                                                  # Fall back to NumPy kernels if build fails
   )
 ]
 
@@ -44,7 +80,7 @@ setup(
   install_requires     = [ ],
   ext_modules          = cythonize( exts ),
   include_dirs         = [numpy.get_include()],
-  cmdclass             = {'build_ext' : build_ext},
+  cmdclass             = {'build_ext' : openmp_build_ext},
   scripts              = [],
   zip_safe             = False,
 )
@@ -0,0 +1,103 @@
+"""
+Smoke tests of the IDL job system, with benchmarks/fake_idl.py in place
+of IDL so they run without an IDL installation or licence
+
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from idlpy import idlSpawn
+from idlpy.idlSpawn import IDLJob, IDLAsyncQueue, IDLExecutor, IDLAsyncioQueue
+
+FAKE_IDL = os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ), 'benchmarks', 'fake_idl.py' )
+
+@pytest.fixture( autouse = True )
+def fakeIDL( monkeypatch ):
+  """Run jobs with the stand-in for IDL"""
+
+  monkeypatch.setattr( idlSpawn, 'IDL_EXE', FAKE_IDL )
+  for key in ('FAKEIDL_STARTUP', 'FAKEIDL_SLEEP', 'FAKEIDL_LINES', 'FAKEIDL_FAIL'):
+    monkeypatch.delenv( key, raising = False )
+
+def startOrder( jobs ):
+  """Jobs in the order they started"""
+
+  return sorted( jobs, key = lambda job: job.startTime )
+
+def test_job_success():
+  job = IDLJob( "PRINT, 'hello'" )
+  assert job.start() is False
+  assert job.failed is False
+
+def test_job_failure():
+  job = IDLJob( 'FAIL' )
+  assert job.start() is True
+  assert job.failed is True
+
+def test_queue_success_and_failure():
+  queue = IDLAsyncQueue( 2 )
+  for cmd in ('WAIT, 0', 'FAIL', 'WAIT, 0'):
+    queue.submitJob( IDLJob( cmd ) )
+  assert queue.startJobs() == (2, 3)
+  queue.close()
+
+def test_queue_priority():
+  queue = IDLAsyncQueue( 1 )
+  jobs  = {priority : IDLJob( 'WAIT, 0.{}'.format( priority ) ) for priority in (0, 2, 1)}
+  for priority, job in jobs.items():
+    queue.submitJob( job, priority = priority )
+  assert queue.startJobs() == (3, 3)
+  queue.close()
+  assert startOrder( jobs.values() ) == [jobs[p] for p in (2, 1, 0)]
+
+def test_executor_success_and_failure():
+  with IDLExecutor( 2 ) as executor:
+    ok  = executor.submit( IDLJob( 'WAIT, 0' ) )
+    bad = executor.submit( IDLJob( 'FAIL' ) )
+    assert ok.result( timeout = 30 ).failed is False
+    assert bad.result( timeout = 30 ).failed is True
+
+def test_executor_priority():
+  with IDLExecutor( 1 ) as executor:
+    first   = executor.submit( IDLJob( 'WAIT, 0.5' ), priority = 10 )               # Holds the slot while the others queue
+    jobs    = {priority : IDLJob( 'WAIT, 0.0{}'.format( priority ) ) for priority in (0, 2, 1)}
+    futures = [executor.submit( job, priority = priority ) for priority, job in jobs.items()]
+    for future in [first] + futures:
+      assert future.result( timeout = 30 ).failed is False
+  assert startOrder( [first.result()] + list( jobs.values() ) ) == [first.result()] + [jobs[p] for p in (2, 1, 0)]
+
+def test_asyncio_queue():
+  async def run():
+    queue = IDLAsyncioQueue( 2 )
+    for cmd in ('WAIT, 0', 'FAIL'):
+      queue.submitJob( IDLJob( cmd ) )
+    return await queue.join()
+  assert asyncio.run( run() ) == (1, 2)
+
+def test_executor_submit_from_callback():
+  with IDLExecutor( 2 ) as executor:
+    chained = []
+    first   = executor.submit( IDLJob( 'WAIT, 0' ) )
+    first.add_done_callback( lambda future: chained.append( executor.submit( IDLJob( 'WAIT, 0' ) ) ) )
+    assert first.result( timeout = 30 ).failed is False
+    assert executor.submit( IDLJob( 'WAIT, 0' ) ).result( timeout = 30 ).failed is False
+    assert chained[0].result( timeout = 30 ).failed is False
+
+def test_executor_submitJob():
+  with IDLExecutor( 1 ) as executor:
+    future = executor.submitJob( IDLJob( 'WAIT, 0' ) )
+    assert future.result( timeout = 30 ).failed is False
+    assert executor.submit( IDLJob( 'WAIT, 0' ) ).result( timeout = 30 ).failed is False
+
+def test_executor_cancel_futures():
+  executor = IDLExecutor( 1 )
+  running  = executor.submit( IDLJob( 'WAIT, 0.5' ), priority = 1 )
+  pending  = [executor.submit( IDLJob( 'WAIT, 0' ) ) for i in range( 3 )]
+  while not running.running():
+    time.sleep( 0.01 )
+  executor.shutdown( cancel_futures = True )
+  assert running.result().failed is False
+  assert all( future.cancelled() for future in pending )
@@ -0,0 +1,241 @@
+"""
+Tests of interpolation against a simple reference, run with each backend
+
+The reference builds the neighbours and weights of every output element
+separately, following the rules of the IDL INTERPOLATE() function as
+implemented by the kernels: indices outside of the data are clamped to
+the nearest edge, and neighbours with zero weight are not blended.
+
+"""
+import importlib
+import itertools
+
+import numpy as np
+import pytest
+
+from idlpy.interpolate import Interpolator, interpolate, interpol, threads
+
+MODULE  = importlib.import_module( 'idlpy.interpolate' )
+KERNELS = ('_buildTaps', '_locate', '_gather1d', '_gather2d', '_gather3d',
+           '_gather2d_points', '_gather3d_points', '_gathernd', '_gathernd_points')
+
+@pytest.fixture( autouse = True, params = ['numpy', 'cython'] )
+def backend( request, monkeypatch ):
+  """Run each test with the kernels of each backend"""
+
+  if request.param == 'numpy':
+    kernels = importlib.import_module( 'idlpy._interpolate_numpy' )
+  else:
+    kernels = pytest.importorskip( 'idlpy._interpolate' )
+  for name in KERNELS:
+    monkeypatch.setattr( MODULE, name, getattr( kernels, name ) )
+  return request.param
+
+def cubicWeight( s, a ):
+  """Cubic convolution kernel of Park and Schowengerdt (1983)"""
+
+  s = abs( s )
+  if s <= 1:
+    return ((a + 2) * s - (a + 3)) * s * s + 1
+  if s < 2:
+    return ((a * s - 5 * a) * s + 8 * a) * s - 4 * a
+  return 0.0
+
+def taps( id, n, cubic ):
+  """Neighbour indices and weights of one index along an axis of length n"""
+
+  if not cubic:
+    i0 = min( max( int( id ), 0 ), n-1 )                                                # Truncate toward zero, then clamp
+    i1 = min( i0 + 1, n-1 )
+    d  = id - i0 if i0 <= id < i1 else 0.0
+    return [(i0, 1 - d), (i1, d)]
+  if 0 <= id < n-1:
+    i0 = int( np.floor( id ) )
+    t  = id - i0
+  else:
+    i0 = 0 if id < 0 else n-1
+    t  = 0.0
+  return [(min( max( i0 - 1 + k, 0 ), n-1 ), cubicWeight( t - (k - 1), cubic )) for k in range( 4 )]
+
+def reference( data, ids, grid = True, cubic = None, missing = None, nan = False ):
+  """Interpolate data one output element at a time"""
+
+  ndim   = len(ids)
+  dims   = data.shape[data.ndim-ndim:]
+  batch  = data.shape[:data.ndim-ndim]
+  ids    = [np.atleast_1d( np.asarray( id, dtype = np.float64 ) ) for id in ids]
+  if grid:
+    shape  = tuple( id.size for id in ids )
+    points = list( itertools.product( *[id.ravel() for id in ids] ) )
+  else:
+    shape  = ids[0].shape
+    points = list( zip( *[id.ravel() for id in ids] ) )
+
+  out = np.empty( batch + (len(points),), dtype = np.float64 )
+  for bid in np.ndindex( *batch ):
+    for p, point in enumerate( points ):
+      if missing is not None and any( id < 0 or id > n-1 for id, n in zip( point, dims ) ):
+        out[bid + (p,)] = missing
+        continue
+      acc, accW = 0.0, 0.0
+      for corner in itertools.product( *[taps( id, n, cubic ) for id, n in zip( point, dims )] ):
+        wt = np.prod( [w for i, w in corner] )
+        if wt == 0:
+          continue
+        v = float( data[bid + tuple( i for i, w in corner )] )
+        if nan and np.isnan( v ):
+          continue
+        acc  += v * wt
+        accW += wt
+      out[bid + (p,)] = (acc / accW if accW != 0 else np.nan) if nan else acc           # All NaN neighbours gives NaN
+  out = out.reshape( batch + shape )
+  if data.dtype.kind in 'iu':
+    return np.trunc( out ).astype( data.dtype )
+  return out.astype( data.dtype )
+
+def indices( n ):
+  """Indices along an axis of length n: outside, on, and between elements"""
+
+  return np.array( [-1.5, -0.25, 0.0, 0.4, (n-1) / 2.0, n-1.6, n-1.0, n-0.5, n+2.0] )
+
+def gridIndices( shape ):
+  """Indices for each axis of shape; fewer on leading axes, to keep the reference fast"""
+
+  return [indices( n ) if a == len(shape)-1 else indices( n )[1::2] for a, n in enumerate( shape )]
+
+def check( res, ref ):
+  """Compare a result to the reference, allowing for rounding"""
+
+  assert res.dtype == ref.dtype
+  assert res.shape == ref.shape
+  if ref.dtype.kind in 'iu':
+    np.testing.assert_allclose( res, ref, atol = 1 )                                    # Truncation of values close to integers may differ
+  else:
+    rtol = 1e-5 if ref.dtype == np.float32 else 1e-10
+    np.testing.assert_allclose( res, ref, rtol = rtol, atol = rtol * 100 )
+
+def makeData( shape, dtype, seed = 0 ):
+  """Random data in the range 50-150, in the given type"""
+
+  return (50 + 100 * np.random.default_rng( seed ).random( shape )).astype( dtype )
+
+@pytest.mark.parametrize( 'shape', [(7,), (5, 6), (4, 5, 6), (3, 4, 5, 6)] )
+@pytest.mark.parametrize( 'dtype', ['uint8', 'int16', 'int8', 'float32', 'float64'] )
+@pytest.mark.parametrize( 'cubic', [None, -0.5] )
+def test_grid( shape, dtype, cubic ):
+  data = makeData( shape, dtype )
+  ids  = gridIndices( shape )
+  check( interpolate( data, *ids, cubic = cubic ), reference( data, ids, cubic = cubic ) )
+
+@pytest.mark.parametrize( 'shape', [(7,), (5, 6), (4, 5, 6), (3, 4, 5, 6)] )
+@pytest.mark.parametrize( 'cubic', [None, -0.5] )
+def test_points( shape, cubic ):
+  data = makeData( shape, 'float64' )
+  rng  = np.random.default_rng( 1 )
+  ids  = [rng.uniform( -1, n, (3, 4) ) for n in shape]
+  ids[0][0,0] = 1.0                                                                     # On an element
+  check( interpolate( data, *ids, grid = False, cubic = cubic ),
+         reference( data, ids, grid = False, cubic = cubic ) )
+
+@pytest.mark.parametrize( 'shape', [(7,), (5, 6), (4, 5, 6), (3, 4, 5, 6)] )
+@pytest.mark.parametrize( 'grid', [True, False] )
+def test_missing( shape, grid ):
+  data = makeData( shape, 'float32' )
+  ids  = gridIndices( shape ) if grid else [indices( n ) for n in shape]
+  check( interpolate( data, *ids, grid = grid, missing = -9 ),
+         reference( data, ids, grid = grid, missing = -9 ) )
+
+@pytest.mark.parametrize( 'shape', [(7,), (5, 6), (4, 5, 6), (3, 4, 5, 6)] )
+@pytest.mark.parametrize( 'cubic', [None, -0.5] )
+def test_nan( shape, cubic ):
+  data = makeData( shape, 'float64' )
+  data.flat[::5] = np.nan
+  ids  = gridIndices( shape )
+  for nan in (False, True):
+    check( interpolate( data, *ids, cubic = cubic, nan = nan ), reference( data, ids, cubic = cubic, nan = nan ) )
+
+@pytest.mark.filterwarnings( 'error' )
+@pytest.mark.parametrize( 'cubic', [None, -0.5] )
+def test_inf( cubic ):
+  data = np.array( [1.0, np.inf, 3.0, -np.inf] )
+  ids  = [np.array( [-2.0, 0.0, 1.0, 2.0, 3.0, 7.0] )]                                 # On elements and clamped to the edges
+  res  = interpolate( data, *ids, cubic = cubic )
+  check( res, reference( data, ids, cubic = cubic ) )
+  np.testing.assert_array_equal( res[2:], [np.inf, 3.0, -np.inf, -np.inf] )
+
+@pytest.mark.filterwarnings( 'error' )
+@pytest.mark.parametrize( 'shape', [(5, 6), (4, 5, 6), (3, 4, 5, 6)] )
+@pytest.mark.parametrize( 'grid', [True, False] )
+def test_inf_nd( shape, grid ):
+  data = makeData( shape, 'float64' )
+  data[(1,) * len(shape)] = np.inf
+  data[(-1,) * len(shape)] = -np.inf
+  ids  = [np.array( [1.0, n-1.0, n+1.0] ) for n in shape]                              # On the inf elements, and clamped to the last
+  res  = interpolate( data, *ids, grid = grid )
+  check( res, reference( data, ids, grid = grid ) )
+  assert not np.isnan( res ).any()
+
+def test_stack():
+  data = makeData( (2, 3, 5, 6), 'float32' )
+  ids  = [indices( 5 ), indices( 6 )]
+  res  = interpolate( data, *ids )
+  assert res.shape == (2, 3, 9, 9)
+  check( res, reference( data, ids ) )
+
+def test_size1_axes():
+  data = makeData( (1, 4, 1, 6), 'float64' )
+  for grid in (True, False):
+    ids = gridIndices( data.shape ) if grid else [indices( n ) for n in data.shape]
+    check( interpolate( data, *ids, grid = grid, missing = -9 ), reference( data, ids, grid = grid, missing = -9 ) )
+    check( interpolate( data, *ids, grid = grid ), reference( data, ids, grid = grid ) )
+
+def test_plan():
+  plan = Interpolator( (4, 5, 6), *[indices( n ) for n in (4, 5, 6)], missing = -9 )
+  for seed in range( 2 ):
+    data = makeData( (4, 5, 6), 'float64', seed )
+    check( plan( data ), interpolate( data, *[indices( n ) for n in (4, 5, 6)], missing = -9 ) )
+  with pytest.raises( Exception ):
+    plan( makeData( (4, 5, 7), 'float64' ) )
+
+def test_out_and_chunk():
+  data = makeData( (2, 4, 5, 6), 'int16' )
+  ids  = [indices( n ) for n in (4, 5, 6)]
+  ref  = interpolate( data, *ids )
+  out  = np.zeros_like( ref )
+  assert interpolate( data, *ids, out = out ) is out
+  np.testing.assert_array_equal( out, ref )
+  np.testing.assert_array_equal( interpolate( data, *ids, chunk = 2 ), ref )
+  with pytest.raises( Exception ):
+    interpolate( data, *ids, out = np.zeros( ref.shape, dtype = np.float32 ) )
+
+def test_threads():
+  data = makeData( (4, 5, 6), 'float64' )
+  ids  = [indices( n ) for n in (4, 5, 6)]
+  with threads( 1 ):
+    res = interpolate( data, *ids )
+  np.testing.assert_array_equal( res, interpolate( data, *ids, num_threads = 2 ) )
+
+@pytest.mark.parametrize( 'dtype', ['float32', 'float64'] )
+def test_interpol( dtype ):
+  x    = np.array( [0.0, 1.0, 3.0, 7.0, 8.0] )                                         # Not uniform
+  data = np.array( [1.0, 2.0, 0.0, 4.0, 5.0], dtype = dtype )
+  xout = np.array( [0.5, 2.0, 6.0, 7.5] )
+  check( interpol( data, x, xout ), np.interp( xout, x, data.astype( np.float64 ) ).astype( dtype ) )
+  check( interpol( data[::-1].copy(), x[::-1].copy(), xout ), np.interp( xout, x, data.astype( np.float64 ) ).astype( dtype ) )
+
+@pytest.mark.parametrize( 'x0', [0.0, 2460000.0, 1.7e9] )
+def test_interpol_times( x0 ):
+  """Large coordinates, e.g., Julian days or epoch seconds, with float32 data"""
+
+  x    = x0 + np.arange( 48 ) / 24.0
+  data = np.arange( 48, dtype = np.float32 )
+  xout = x0 + np.array( [1.5, 30.25] ) / 24.0
+  np.testing.assert_allclose( interpol( data, x, xout ), [1.5, 30.25], rtol = 1e-6 )
+
+def test_interpol_grid():
+  lat  = np.linspace( -90, 90, 7 )
+  lon  = np.arange( 0, 360, 30.0 )
+  data = makeData( (3, 7, 12), 'float64' )
+  out  = interpol( data, (lat, lon), (np.array( [-45.0, 10.0] ), np.array( [15.0, 100.0, 359.0] )) )
+  ref  = interpolate( data, np.array( [1.5, 3 + 1.0/3] ), np.array( [0.5, 100.0/30, 359.0/30] ) )
+  check( out, ref )